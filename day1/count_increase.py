@@ -1,3 +1,14 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+CHUNK_SIZE = 1 << 24
+
+RangeCount = Tuple[int, np.ndarray, np.ndarray]
+
+
 def depth_increase_1(measures):
     return sum(int(measures[i] < measures[i + 1]) for i in range(len(measures) - 1))
 
@@ -6,6 +17,130 @@ def depth_increase_2(measures):
     return sum(int(measures[i + 3] > measures[i]) for i in range(len(measures) - 3))
 
 
+def count_window_increases(measures: np.ndarray, window: int) -> int:
+    """
+    Count how many sliding sums of size `window` are greater than the previous one.
+
+    Two consecutive windows share all but one measure, so the comparison reduces to
+    `measures[i + window] > measures[i]`.
+    """
+    if measures.shape[0] <= window:
+        return 0
+
+    return int(np.count_nonzero(measures[window:] > measures[:-window]))
+
+
+def parse_measures(data: bytes) -> np.ndarray:
+    if not data.strip():
+        return np.empty(0, dtype=np.int64)
+
+    return np.fromstring(data, dtype=np.int64, sep=' ')
+
+
+def line_aligned_offsets(file_path: str, parts: int) -> List[int]:
+    """
+    Split the file in `parts` byte ranges, moving every cut right after the next newline.
+
+    :return: the sorted offsets delimiting the ranges, file size included
+    """
+    file_size = os.path.getsize(file_path)
+    offsets = [0]
+
+    with open(file_path, 'rb') as fp:
+        for part in range(1, parts):
+            fp.seek(max(file_size * part // parts, offsets[-1]))
+            fp.readline()
+            offsets.append(min(fp.tell(), file_size))
+
+    offsets.append(file_size)
+
+    return sorted(set(offsets))
+
+
+def count_range_increases(file_path: str, start: int, end: int, window: int, chunk_size: int = CHUNK_SIZE) -> RangeCount:
+    """
+    Stream the measures stored in [start, end) chunk by chunk.
+
+    The last `window` measures of a chunk are carried over to the next one, so the
+    comparisons straddling a chunk boundary are not lost.
+
+    :return: the increases inside the range, its first and its last `window` measures
+    """
+    increases = 0
+    head = np.empty(0, dtype=np.int64)
+    carry = np.empty(0, dtype=np.int64)
+    pending = b''
+
+    with open(file_path, 'rb') as fp:
+        fp.seek(start)
+        remaining = end - start
+
+        while remaining > 0 or pending:
+            data = fp.read(min(chunk_size, remaining)) if remaining > 0 else b''
+            remaining -= len(data)
+
+            data = pending + data
+            if remaining > 0:
+                cut = data.rfind(b'\n') + 1
+                data, pending = data[:cut], data[cut:]
+            else:
+                pending = b''
+
+            measures = np.concatenate((carry, parse_measures(data)))
+            increases += count_window_increases(measures, window)
+
+            if head.shape[0] < window:
+                head = measures[:window].copy()
+            carry = measures[-window:].copy()
+
+    return increases, head, carry
+
+
+def merge_range_counts(partials: List[RangeCount], window: int) -> int:
+    increases = 0
+    tail = np.empty(0, dtype=np.int64)
+
+    for range_increases, head, range_tail in partials:
+        boundary = np.concatenate((tail, head))
+        pairs = max(0, min(tail.shape[0], boundary.shape[0] - window))
+        straddling = boundary[window:window + pairs] > boundary[:pairs]
+
+        increases += range_increases + int(np.count_nonzero(straddling))
+        tail = np.concatenate((tail, range_tail))[-window:]
+
+    return increases
+
+
+def count_increases_in_file(file_path: str, window: int = 1, chunk_size: int = CHUNK_SIZE,
+                            workers: Optional[int] = None) -> int:
+    """
+    Count the increases of the sliding windows without loading the whole file.
+
+    Memory is bounded by `chunk_size` per worker. With `workers` greater than one the file
+    is split in line-aligned ranges, each one processed by a different process.
+    """
+    assert window >= 1
+
+    if workers is None or workers <= 1:
+        increases, _, _ = count_range_increases(file_path, 0, os.path.getsize(file_path), window, chunk_size)
+        return increases
+
+    offsets = line_aligned_offsets(file_path, workers)
+    ranges = list(zip(offsets[:-1], offsets[1:]))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        partials = list(executor.map(
+            count_range_increases,
+            [file_path] * len(ranges),
+            [start for start, _ in ranges],
+            [end for _, end in ranges],
+            [window] * len(ranges),
+            [chunk_size] * len(ranges),
+        ))
+
+    return merge_range_counts(partials, window)
+
+
 def main():
     with open("input.txt", "r") as fp:
         measures = [int(value) for value in fp.readlines()]
@@ -13,6 +148,11 @@ def main():
     assert depth_increase_1(measures) == 1475
     assert depth_increase_2(measures) == 1516
 
+    assert count_increases_in_file("input.txt", window=1) == 1475
+    assert count_increases_in_file("input.txt", window=3) == 1516
+    assert count_increases_in_file("input.txt", window=3, chunk_size=64, workers=4) == 1516
+    assert count_increases_in_file("input.txt", window=1, chunk_size=7, workers=64) == 1475
+
 
 if __name__ == '__main__':
     main()
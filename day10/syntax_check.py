@@ -1,5 +1,10 @@
 import math
-from typing import List
+import mmap
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Tuple, Optional, Generator
 
 Record = List[str]
 
@@ -92,6 +97,226 @@ def get_autocompletition_score(records: List[Record]) -> int:
     return autocomplete_scores[winner_pos]
 
 
+# translate every byte to its bracket class: 1-4 for the opening brackets, 5-8 for the
+# matching closing ones, in the order of their autocompletition score
+OPENING_CLASSES = b'([{<'
+CLOSING_CLASSES = b')]}>'
+BRACKET_CLASS_TABLE = bytes.maketrans(
+    OPENING_CLASSES + CLOSING_CLASSES, bytes(range(1, 2 * len(OPENING_CLASSES) + 1))
+)
+CLOSING_OFFSET = len(OPENING_CLASSES)
+
+ERROR_SCORE_BY_CLASS = [0] + [SYNTAX_ERROR_SCORE[chr(ch)] for ch in CLOSING_CLASSES]
+
+
+def read_raw_input(file_path: str) -> List[bytes]:
+    with open(file_path, 'rb') as f:
+        return f.read().split()
+
+
+def check_raw_record(record: bytes) -> Tuple[int, int]:
+    """
+    Check a record with a single pass on its stack of open brackets.
+
+    :return: the syntax error score and the autocompletition score, the latter always 0
+        for corrupted records
+    """
+    open_brackets = []
+    for bracket in record.translate(BRACKET_CLASS_TABLE):
+        if bracket <= CLOSING_OFFSET:
+            open_brackets.append(bracket)
+        elif not open_brackets or open_brackets.pop() != bracket - CLOSING_OFFSET:
+            return ERROR_SCORE_BY_CLASS[bracket - CLOSING_OFFSET], 0
+
+    score = 0
+    for bracket in reversed(open_brackets):
+        score = score * 5 + bracket
+
+    return 0, score
+
+
+def select_kth(values: list, k: int) -> int:
+    """
+    k-th smallest value, with a randomized quickselect taking linear time on average.
+    """
+    while True:
+        pivot = random.choice(values)
+        lower = [value for value in values if value < pivot]
+        if k < len(lower):
+            values = lower
+            continue
+
+        equal_count = sum(1 for value in values if value == pivot)
+        if k < len(lower) + equal_count:
+            return pivot
+
+        k -= len(lower) + equal_count
+        values = [value for value in values if value > pivot]
+
+
+def check_raw_records(records: List[bytes]) -> Tuple[int, int]:
+    """
+    :return: the total syntax error score and the middle autocompletition score
+    """
+    syntax_error_score = 0
+    autocomplete_scores = []
+
+    for record in records:
+        error_score, autocomplete_score = check_raw_record(record)
+        syntax_error_score += error_score
+        if error_score == 0:
+            autocomplete_scores.append(autocomplete_score)
+
+    if len(autocomplete_scores) == 0:
+        return syntax_error_score, 0
+
+    return syntax_error_score, select_kth(autocomplete_scores, len(autocomplete_scores) // 2)
+
+
+NAVIGATION_CHUNK_SIZE = 1 << 24
+CHUNK_SAMPLE_SIZE = 64
+COLLECT_LIMIT = 1 << 16
+
+
+@dataclass
+class ChunkScan:
+    """
+    Partial results of a chunk of navigation records, restricted to the autocompletition
+    scores in the [lo, hi] range of a selection round.
+    """
+    syntax_error_score: int = 0
+    below: int = 0
+    inside: int = 0
+    sample: List[int] = field(default_factory=list)
+    collected: List[int] = field(default_factory=list)
+
+    def __iadd__(self, other: "ChunkScan") -> "ChunkScan":
+        self.syntax_error_score += other.syntax_error_score
+        self.below += other.below
+        self.inside += other.inside
+        self.sample.extend(other.sample)
+        self.collected.extend(other.collected)
+
+        return self
+
+
+def line_aligned_chunks(file_path: str, chunk_size: int) -> Generator[Tuple[int, int], None, None]:
+    file_size = os.path.getsize(file_path)
+    start = 0
+
+    with open(file_path, 'rb') as f:
+        while start < file_size:
+            f.seek(min(start + chunk_size, file_size))
+            f.readline()
+            end = min(f.tell(), file_size)
+
+            yield start, end
+            start = end
+
+
+def scan_navigation_chunk(file_path: str, start: int, end: int,
+                          lo: Optional[int], hi: Optional[int], collect: bool) -> ChunkScan:
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        records = mapped[start:end].split()
+
+    scan = ChunkScan()
+    inside = []
+    for record in records:
+        error_score, autocomplete_score = check_raw_record(record)
+        if error_score > 0:
+            scan.syntax_error_score += error_score
+        elif lo is not None and autocomplete_score < lo:
+            scan.below += 1
+        elif hi is None or autocomplete_score <= hi:
+            inside.append(autocomplete_score)
+
+    scan.inside = len(inside)
+    scan.sample = random.sample(inside, min(CHUNK_SAMPLE_SIZE, len(inside)))
+    if collect:
+        scan.collected = inside
+
+    return scan
+
+
+def scan_navigation_file(file_path: str, chunk_size: int = NAVIGATION_CHUNK_SIZE,
+                         workers: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Check a memory mapped navigation log split in line-aligned chunks, in a process pool
+    when `workers` is greater than one.
+
+    The middle autocompletition score comes from a distributed selection: every round the
+    chunks are scanned again and only report how many scores fall below and inside a range
+    of candidates, plus a small sample used to pick the next, narrower, range. The scores
+    are collected only once few enough of them are left in the range.
+
+    :return: the total syntax error score and the middle autocompletition score
+    """
+    chunks = list(line_aligned_chunks(file_path, chunk_size))
+    executor = ProcessPoolExecutor(max_workers=workers) if workers is not None and workers > 1 else None
+
+    def scan_round(lo: Optional[int], hi: Optional[int], collect: bool = False) -> ChunkScan:
+        arguments = (
+            [file_path] * len(chunks), [start for start, _ in chunks], [end for _, end in chunks],
+            [lo] * len(chunks), [hi] * len(chunks), [collect] * len(chunks)
+        )
+        scans = executor.map(scan_navigation_chunk, *arguments) if executor else map(scan_navigation_chunk, *arguments)
+
+        merged = ChunkScan()
+        for scan in scans:
+            merged += scan
+
+        return merged
+
+    try:
+        current = scan_round(None, None)
+        syntax_error_score = current.syntax_error_score
+        if current.inside == 0:
+            return syntax_error_score, 0
+
+        target = current.inside // 2
+        lo, hi = None, None
+
+        while True:
+            rank = target - current.below
+            if lo is not None and lo == hi:
+                return syntax_error_score, lo
+
+            if current.inside <= COLLECT_LIMIT:
+                return syntax_error_score, select_kth(scan_round(lo, hi, collect=True).collected, rank)
+
+            if len(current.sample) == 0:
+                current = scan_round(lo, hi)
+                continue
+
+            sample = sorted(current.sample)
+            pivot_pos = rank * len(sample) // current.inside
+            margin = math.isqrt(len(sample)) + 1
+            new_lo, new_hi = sample[max(0, pivot_pos - margin)], sample[min(len(sample) - 1, pivot_pos + margin)]
+            if (new_lo, new_hi) == (lo, hi):
+                new_lo = new_hi = sample[pivot_pos]
+
+            candidate = scan_round(new_lo, new_hi)
+            if candidate.below <= target < candidate.below + candidate.inside:
+                lo, hi, current = new_lo, new_hi, candidate
+            elif target < candidate.below:
+                hi = new_lo - 1
+                current = ChunkScan(
+                    below=current.below,
+                    inside=candidate.below - current.below,
+                    sample=[score for score in sample if score < new_lo]
+                )
+            else:
+                lo = new_hi + 1
+                current = ChunkScan(
+                    below=candidate.below + candidate.inside,
+                    inside=current.below + current.inside - candidate.below - candidate.inside,
+                    sample=[score for score in sample if score > new_hi]
+                )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
 def main():
     navigation_records = read_input('input.txt')
     example_records = read_input('input_test.txt')
@@ -101,6 +326,12 @@ def main():
     assert get_autocompletition_score(example_records) == 288957
     assert get_autocompletition_score(navigation_records) == 2421222841
 
+    assert check_raw_records(read_raw_input('input_test.txt')) == (26397, 288957)
+    assert check_raw_records(read_raw_input('input.txt')) == (243939, 2421222841)
+
+    assert scan_navigation_file('input_test.txt') == (26397, 288957)
+    assert scan_navigation_file('input.txt', chunk_size=512, workers=4) == (243939, 2421222841)
+
 
 if __name__ == '__main__':
     main()
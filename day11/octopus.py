@@ -1,77 +1,205 @@
 import numpy as np
 
-from typing import Tuple, List
-
 
 def read_octopuses(file_path: str) -> np.ndarray:
     with open(file_path, 'r') as f:
         return np.array([
             list(map(int, row.strip())) for row in f.readlines()
-        ])
+        ], dtype=np.uint8)
 
 
-def propagate_energy_increase(octopuses_state: np.ndarray):
-    row, col = octopuses_state.shape
-    covered_positions = set()
+FLASH_THRESHOLD = 9
 
-    def select_next_propagation_points(curr_propagation_state: np.ndarray) -> List[Tuple[int, int]]:
-        candidates = np.argwhere(curr_propagation_state >= 10)
 
-        return list(
-            filter(lambda pos: pos not in covered_positions, map(tuple, candidates))
-        )
+def neighbours_count(mask: np.ndarray) -> np.ndarray:
+    """
+    For every octopus, how many of its eight adjacent octopuses are set in the mask, as a
+    3x3 box sum of the zero-padded mask minus its center. Leading axes, if any, index
+    independent grids.
+    """
+    padded = np.zeros(mask.shape[:-2] + (mask.shape[-2] + 2, mask.shape[-1] + 2), dtype=np.uint8)
+    padded[..., 1:-1, 1:-1] = mask
 
-    flashed_pos = select_next_propagation_points(octopuses_state)
-    while len(flashed_pos) != 0:
-        for octopus in flashed_pos:
-            row_neigh = slice(
-                max(0, octopus[0] - 1),
-                min(row - 1, octopus[0] + 1) + 1
-            )
-            col_neigh = slice(
-                max(0, octopus[1] - 1),
-                min(col - 1, octopus[1] + 1) + 1
-            )
+    rows_sum = padded[..., :-2, :] + padded[..., 1:-1, :] + padded[..., 2:, :]
+    box_sum = rows_sum[..., :-2] + rows_sum[..., 1:-1] + rows_sum[..., 2:]
+
+    return box_sum - padded[..., 1:-1, 1:-1]
+
+
+def propagate_energy_increase(octopuses_state: np.ndarray) -> np.ndarray:
+    """
+    Propagate the flashes wave by wave: all the octopuses flashing in a wave increase their
+    neighbours at once, until a wave makes no new octopus flash.
+
+    :return: the mask of the octopuses flashed during the step
+    """
+    flashed = np.zeros(octopuses_state.shape, dtype=bool)
+    flashing = octopuses_state > FLASH_THRESHOLD
+
+    while flashing.any():
+        flashed |= flashing
+        octopuses_state += neighbours_count(flashing).astype(octopuses_state.dtype)
+        flashing = (octopuses_state > FLASH_THRESHOLD) & ~flashed
 
-            octopuses_state[row_neigh, col_neigh] += 1
-            covered_positions.add((octopus[0], octopus[1]))
+    return flashed
 
-        flashed_pos = select_next_propagation_points(octopuses_state)
 
+def simulate_step(octopuses_state: np.ndarray) -> int:
+    """
+    Run a step in place.
 
-def count_flashes_in_step(initial_octopuses_state: np.ndarray, step: int) -> np.ndarray:
-    curr_state = initial_octopuses_state.copy()
+    :return: the number of flashes during the step
+    """
+    octopuses_state += 1
+    flashed = propagate_energy_increase(octopuses_state)
+    octopuses_state[flashed] = 0
 
-    total_flashes = 0
-    for _ in range(step):
-        curr_state += 1
-        propagate_energy_increase(curr_state)
+    return int(np.count_nonzero(flashed))
 
-        flashed_octopuses = np.argwhere(curr_state >= 10)
-        curr_state[flashed_octopuses[:, 0], flashed_octopuses[:, 1]] = 0
-        total_flashes += flashed_octopuses.shape[0]
 
-    return total_flashes
+def count_flashes_in_step(initial_octopuses_state: np.ndarray, step: int) -> int:
+    curr_state = initial_octopuses_state.astype(np.uint8)
+
+    return sum(simulate_step(curr_state) for _ in range(step))
 
 
 def get_first_step_all_flashes(initial_octopuses_state: np.ndarray) -> int:
     curr_step = 0
-    curr_state = initial_octopuses_state.copy()
+    curr_state = initial_octopuses_state.astype(np.uint8)
 
     def all_octopuses_flashes(curr_octopuses_state: np.ndarray) -> bool:
         return not np.any(curr_octopuses_state)
 
     while not all_octopuses_flashes(curr_state):
-        curr_state += 1
+        simulate_step(curr_state)
         curr_step += 1
-        propagate_energy_increase(curr_state)
-
-        flashed_octopuses = np.argwhere(curr_state >= 10)
-        curr_state[flashed_octopuses[:, 0], flashed_octopuses[:, 1]] = 0
 
     return curr_step
 
 
+class OctopusesBatch:
+    """
+    Independent grids of the same shape, stacked in one 3-D array and stepped together.
+
+    Cycles are found with Brent's algorithm: every grid keeps one packed reference state,
+    compared exactly with its current state and moved forward at every power of two steps.
+    As soon as a grid is back to its reference state it is periodic, and long horizons are
+    answered by skipping whole cycles. Every grid leaves the batch as soon as its own answer
+    is known.
+    """
+
+    def __init__(self, grids: np.ndarray):
+        self.grids = grids.astype(np.uint8)
+        self.num_of_grids = grids.shape[0]
+
+    @staticmethod
+    def pack_states(states: np.ndarray) -> np.ndarray:
+        """
+        Energy levels fit in 4 bits, so two octopuses share a byte.
+        """
+        flat = states.reshape(states.shape[0], -1)
+        if flat.shape[1] % 2:
+            flat = np.pad(flat, ((0, 0), (0, 1)))
+
+        return (flat[:, 0::2] << 4) | flat[:, 1::2]
+
+    @staticmethod
+    def simulate_step(states: np.ndarray) -> np.ndarray:
+        states += 1
+        flashed = propagate_energy_increase(states)
+        states[flashed] = 0
+
+        return flashed.sum(axis=(1, 2))
+
+    def count_flashes(self, steps: int) -> np.ndarray:
+        """
+        :return: the flashes of every grid after `steps`
+        """
+        totals = np.zeros(self.num_of_grids, dtype=np.int64)
+        states, grid_ids = self.grids.copy(), np.arange(self.num_of_grids)
+
+        references = self.pack_states(states)
+        reference_steps = np.zeros(self.num_of_grids, dtype=np.int64)
+        powers = np.ones(self.num_of_grids, dtype=np.int64)
+
+        # flashes before the reference state, and cumulative flashes since it
+        flashes_before_reference = np.zeros(self.num_of_grids, dtype=np.int64)
+        flashes_since_reference = [[0] for _ in range(self.num_of_grids)]
+
+        for step in range(1, steps + 1):
+            if grid_ids.shape[0] == 0:
+                break
+
+            flashes = self.simulate_step(states)
+            packed = self.pack_states(states)
+            back_to_reference = (packed == references).all(axis=1)
+            still_running = np.ones(grid_ids.shape[0], dtype=bool)
+
+            for pos, grid in enumerate(grid_ids):
+                since_reference = flashes_since_reference[grid]
+                since_reference.append(since_reference[-1] + int(flashes[pos]))
+                flashes_so_far = int(flashes_before_reference[grid]) + since_reference[-1]
+
+                if step == steps:
+                    totals[grid] = flashes_so_far
+                    still_running[pos] = False
+                elif back_to_reference[pos]:
+                    period = step - int(reference_steps[grid])
+                    full_cycles, remainder = divmod(steps - step, period)
+
+                    totals[grid] = flashes_so_far + full_cycles * since_reference[-1] + since_reference[remainder]
+                    still_running[pos] = False
+                elif step - reference_steps[grid] == powers[grid]:
+                    references[pos] = packed[pos]
+                    reference_steps[grid] = step
+                    powers[grid] *= 2
+                    flashes_before_reference[grid] = flashes_so_far
+                    flashes_since_reference[grid] = [0]
+
+            states, grid_ids = states[still_running], grid_ids[still_running]
+            references = references[still_running]
+
+        return totals
+
+    def get_first_steps_all_flashes(self) -> np.ndarray:
+        """
+        :return: the first step all the octopuses of a grid flash together, -1 for the
+            grids entering a cycle without ever synchronizing
+        """
+        first_steps = np.full(self.num_of_grids, -1, dtype=np.int64)
+        states, grid_ids = self.grids.copy(), np.arange(self.num_of_grids)
+
+        all_zero = ~states.reshape(self.num_of_grids, -1).any(axis=1)
+        first_steps[all_zero] = 0
+        states, grid_ids = states[~all_zero], grid_ids[~all_zero]
+
+        references = self.pack_states(states)
+        reference_steps = np.zeros(grid_ids.shape[0], dtype=np.int64)
+        powers = np.ones(grid_ids.shape[0], dtype=np.int64)
+
+        step = 0
+        while grid_ids.shape[0] > 0:
+            step += 1
+            flashes = self.simulate_step(states)
+            synchronized = flashes == states[0].size
+            first_steps[grid_ids[synchronized]] = step
+
+            packed = self.pack_states(states)
+            still_running = ~synchronized & ~(packed == references).all(axis=1)
+
+            move_reference = still_running & (step - reference_steps == powers)
+            references[move_reference] = packed[move_reference]
+            reference_steps[move_reference] = step
+            powers[move_reference] *= 2
+
+            states, grid_ids = states[still_running], grid_ids[still_running]
+            references, reference_steps, powers = (
+                references[still_running], reference_steps[still_running], powers[still_running]
+            )
+
+        return first_steps
+
+
 def main():
     octopuses = read_octopuses('input.txt')
     test_matrix = read_octopuses('input_test.txt')
@@ -82,6 +210,13 @@ def main():
     assert get_first_step_all_flashes(test_matrix) == 195
     assert get_first_step_all_flashes(octopuses) == 329
 
+    batch = OctopusesBatch(np.stack([test_matrix, octopuses]))
+    assert list(batch.count_flashes(100)) == [count_flashes_in_step(test_matrix, 100), 1627]
+    assert list(batch.count_flashes(1000)) == [
+        count_flashes_in_step(test_matrix, 1000), count_flashes_in_step(octopuses, 1000)
+    ]
+    assert list(batch.get_first_steps_all_flashes()) == [195, 329]
+
 
 if __name__ == '__main__':
     main()
@@ -1,10 +1,19 @@
 import dataclasses
-import copy
+import functools
+import multiprocessing
+import multiprocessing.synchronize
+import os
+import queue
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from sys import path
 
+import numpy as np
 
-from typing import List, Dict, Tuple, Set
+from typing import List, Dict, Tuple, Set, Union, Optional, Generator
 
+PATHS_BATCH_SIZE = 1024
+QUEUE_POLL_SECONDS = 0.1
 
 
 @dataclasses.dataclass(frozen=True)
@@ -92,57 +101,373 @@ class SubterraneanPath:
         return self.get_last_traversed_cave() == END_CAVE
 
 
-def step_1(subterranean: SubterraneanNetwork) -> int:
+@dataclasses.dataclass
+class CompiledSubterraneanNetwork:
+    """
+    Network with the caves interned to integer ids and the connections stored as CSR
+    arrays: the neighbors of cave `i` are `targets[offsets[i]:offsets[i + 1]]`.
+
+    Small caves also get a bit position, so a set of traversed small caves is a bitmask.
+    """
+    names: List[str]
+    offsets: np.ndarray
+    targets: np.ndarray
+    is_small: np.ndarray
+    small_bit: np.ndarray
+    start: int
+    end: int
+    _adjacency: Optional[List[List[int]]] = dataclasses.field(default=None, init=False, repr=False, compare=False)
+
+    @staticmethod
+    def from_connections(connections: List[Tuple[str, str]]) -> "CompiledSubterraneanNetwork":
+        ids = {}  # type: Dict[str, int]
+        for first, second in connections:
+            ids.setdefault(first, len(ids))
+            ids.setdefault(second, len(ids))
+
+        names = list(ids)
+        sources = np.array([ids[first] for first, second in connections] + [ids[second] for first, second in connections],
+                           dtype=np.int32)
+        targets = np.array([ids[second] for first, second in connections] + [ids[first] for first, second in connections],
+                           dtype=np.int32)
+
+        order = np.argsort(sources, kind='stable')
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(sources, minlength=len(names))))).astype(np.int32)
+
+        is_small = np.array([name.islower() for name in names], dtype=bool)
+        small_bit = np.zeros(len(names), dtype=object)
+        small_bit[is_small] = [1 << pos for pos in range(int(is_small.sum()))]
+
+        return CompiledSubterraneanNetwork(
+            names, offsets, targets[order], is_small, small_bit, ids[START_CAVE.name], ids[END_CAVE.name]
+        )
+
+    @staticmethod
+    def load_from_file(filepath: str) -> "CompiledSubterraneanNetwork":
+        with open(filepath) as fp:
+            return CompiledSubterraneanNetwork.from_connections([
+                tuple(row.strip().split('-')) for row in fp.readlines() if row.strip()
+            ])
+
+    def adjacency(self) -> List[List[int]]:
+        """
+        Neighbors of every cave as Python lists, built once and shared by every traversal.
+        """
+        if self._adjacency is None:
+            offsets, targets = self.offsets.tolist(), self.targets.tolist()
+            self._adjacency = [targets[offsets[cave]:offsets[cave + 1]] for cave in range(len(self.names))]
+
+        return self._adjacency
+
+    def path_names(self, path: List[int]) -> List[str]:
+        return [self.names[cave] for cave in path]
+
+
+def compile_network(subterranean: Union[SubterraneanNetwork, CompiledSubterraneanNetwork]) -> CompiledSubterraneanNetwork:
+    if isinstance(subterranean, CompiledSubterraneanNetwork):
+        return subterranean
+
+    return CompiledSubterraneanNetwork.from_connections([
+        (cave.name, neighbor.name)
+        for cave, neighbors in subterranean.neighbors.items()
+        for neighbor in neighbors
+        if cave.name <= neighbor.name
+    ])
+
+
+Network = Union[SubterraneanNetwork, CompiledSubterraneanNetwork]
+
+
+def step_1(subterranean: Network) -> int:
+    network = compile_network(subterranean)
+    neighbors, small_bit = network.adjacency(), network.small_bit.tolist()
     path_to_end = 0
-    
-    current_paths = [[START_CAVE]]
+
+    current_paths = [(network.start, small_bit[network.start])]
 
     while len(current_paths) > 0:
-        path = current_paths.pop()
+        last_cave, traversed = current_paths.pop()
 
-        for neighbor in subterranean.get_neighbors(path[-1]):
-            if neighbor in path and not neighbor.is_big():
+        for neighbor in neighbors[last_cave]:
+            if traversed & small_bit[neighbor]:
                 continue
 
-            if neighbor == END_CAVE:
+            if neighbor == network.end:
                 path_to_end += 1
             else:
-                current_paths.append(path + [neighbor])
-
+                current_paths.append((neighbor, traversed | small_bit[neighbor]))
 
     return path_to_end
 
 
-def step_2(subterranean: SubterraneanNetwork) -> int:
+def step_2(subterranean: Network) -> int:
+    network = compile_network(subterranean)
+    neighbors, small_bit = network.adjacency(), network.small_bit.tolist()
     path_to_end = 0
-    
-    def copy_path(path: SubterraneanPath) -> SubterraneanPath:
-        return copy.deepcopy(path)
-    
-    first_path = SubterraneanPath()
-    first_path.move_to_cave(START_CAVE)
-    current_paths = [first_path]
+
+    current_paths = [(network.start, small_bit[network.start], False)]
 
     while len(current_paths) > 0:
-        path = current_paths.pop()
-        
-        last_cave = path.get_last_traversed_cave()
-        for neighbor in subterranean.get_neighbors(last_cave):
-            if neighbor == START_CAVE:
-                continue
+        last_cave, traversed, traversed_twice = current_paths.pop()
 
-            new_path = copy_path(path)
-            if new_path.can_move_to_cave(neighbor):
-                new_path.move_to_cave(neighbor)
+        for neighbor in neighbors[last_cave]:
+            if neighbor == network.start:
+                continue
 
-                if not new_path.path_ended():
-                    current_paths.append(new_path)
-                else:
-                    path_to_end += 1
+            if neighbor == network.end:
+                path_to_end += 1
+            elif not traversed & small_bit[neighbor]:
+                current_paths.append((neighbor, traversed | small_bit[neighbor], traversed_twice))
+            elif not traversed_twice:
+                current_paths.append((neighbor, traversed, True))
 
     return path_to_end
 
 
+def collapse_big_caves(network: CompiledSubterraneanNetwork) -> List[Counter]:
+    """
+    Replace every big cave with weighted edges between the small caves around it: moving
+    from a small cave to another through a big cave is one more way to connect them.
+
+    :return: for every cave, how many ways lead to every small cave one step away
+    """
+    neighbors, is_small = network.adjacency(), network.is_small.tolist()
+    weighted_neighbors = [Counter() for _ in network.names]  # type: List[Counter]
+
+    for cave, cave_neighbors in enumerate(neighbors):
+        if is_small[cave]:
+            weighted_neighbors[cave].update(neighbor for neighbor in cave_neighbors if is_small[neighbor])
+            continue
+
+        assert all(is_small[neighbor] for neighbor in cave_neighbors), "infinite paths between big caves"
+
+        for first in cave_neighbors:
+            weighted_neighbors[first].update(cave_neighbors)
+
+    return weighted_neighbors
+
+
+def count_paths(subterranean: Network, allow_small_cave_twice: bool) -> int:
+    """
+    Count the paths instead of enumerating them, memoizing on the current cave, the set of
+    small caves already traversed (as a bitmask) and whether a small cave was already
+    traversed twice.
+    """
+    network = compile_network(subterranean)
+    weighted_neighbors = collapse_big_caves(network)
+    small_bit = network.small_bit.tolist()
+
+    @functools.lru_cache(maxsize=None)
+    def paths_from(cave: int, traversed: int, traversed_twice: bool) -> int:
+        if cave == network.end:
+            return 1
+
+        paths = 0
+        for neighbor, ways in weighted_neighbors[cave].items():
+            if neighbor == network.start:
+                continue
+
+            if not traversed & small_bit[neighbor]:
+                paths += ways * paths_from(neighbor, traversed | small_bit[neighbor], traversed_twice)
+            elif not traversed_twice:
+                paths += ways * paths_from(neighbor, traversed, True)
+
+        return paths
+
+    return paths_from(network.start, small_bit[network.start], not allow_small_cave_twice)
+
+
+# partial path, traversed small caves bitmask and whether a small cave was traversed twice
+SearchState = Tuple[List[int], int, bool]
+
+# whether the path is complete (or just a frontier state), and the search state
+WalkItem = Tuple[bool, SearchState]
+
+
+def walk_paths(network: CompiledSubterraneanNetwork, state: SearchState,
+               frontier_length: Optional[int] = None) -> Generator[WalkItem, None, None]:
+    """
+    Depth-first search with backtracking on a single mutable path: only the path and one
+    neighbors iterator per cave in it are kept, so memory is O(depth).
+
+    The yielded paths are copies. When `frontier_length` is given, partial paths reaching
+    that length are yielded as frontier states instead of being explored.
+    """
+    neighbors, small_bit = network.adjacency(), network.small_bit.tolist()
+    path, traversed, traversed_twice = list(state[0]), state[1], state[2]
+
+    pending_neighbors = [iter(neighbors[path[-1]])]
+    restore = []  # type: List[Tuple[int, bool]]
+
+    while pending_neighbors:
+        for neighbor in pending_neighbors[-1]:
+            if neighbor == network.start:
+                continue
+
+            if neighbor == network.end:
+                yield True, (path + [neighbor], traversed, traversed_twice)
+                continue
+
+            bit = small_bit[neighbor]
+            if not traversed & bit:
+                restore.append((bit, traversed_twice))
+                traversed |= bit
+            elif not traversed_twice:
+                restore.append((0, traversed_twice))
+                traversed_twice = True
+            else:
+                continue
+
+            path.append(neighbor)
+            if frontier_length is not None and len(path) >= frontier_length:
+                yield False, (list(path), traversed, traversed_twice)
+            else:
+                pending_neighbors.append(iter(neighbors[neighbor]))
+                break
+
+            path.pop()
+            bit, traversed_twice = restore.pop()
+            traversed &= ~bit
+        else:
+            pending_neighbors.pop()
+            if restore:
+                path.pop()
+                bit, traversed_twice = restore.pop()
+                traversed &= ~bit
+
+
+def initial_state(network: CompiledSubterraneanNetwork, allow_small_cave_twice: bool) -> SearchState:
+    return [network.start], network.small_bit.tolist()[network.start], not allow_small_cave_twice
+
+
+def iterate_paths(subterranean: Network, allow_small_cave_twice: bool) -> Generator[List[str], None, None]:
+    """
+    Lazily yield every path from start to end, as cave names.
+    """
+    network = compile_network(subterranean)
+
+    for _, (path_ids, _, _) in walk_paths(network, initial_state(network, allow_small_cave_twice)):
+        yield network.path_names(path_ids)
+
+
+# state of the worker processes of iterate_paths_parallel, set once by their initializer
+_worker_network = None  # type: Optional[CompiledSubterraneanNetwork]
+_worker_batches = None  # type: Optional[multiprocessing.Queue]
+_worker_stop = None  # type: Optional[multiprocessing.synchronize.Event]
+
+
+def init_subtree_worker(network: CompiledSubterraneanNetwork, batches: multiprocessing.Queue,
+                        stop: multiprocessing.synchronize.Event):
+    global _worker_network, _worker_batches, _worker_stop
+
+    _worker_network, _worker_batches, _worker_stop = network, batches, stop
+    # batches left in the pipe by an interrupted iteration must not keep the worker alive
+    batches.cancel_join_thread()
+
+
+def put_batch(batch: Optional[List[List[str]]]) -> bool:
+    """
+    :return: whether the batch was queued before the iteration was stopped
+    """
+    while not _worker_stop.is_set():
+        try:
+            _worker_batches.put(batch, timeout=QUEUE_POLL_SECONDS)
+            return True
+        except queue.Full:
+            pass
+
+    return False
+
+
+def stream_subtree(state: SearchState, batch_size: int):
+    """
+    Queue the paths below a frontier state by batches of at most `batch_size`, followed by
+    None once the subtree is exhausted.
+    """
+    try:
+        batch = []
+        for _, (path_ids, _, _) in walk_paths(_worker_network, state):
+            batch.append(_worker_network.path_names(path_ids))
+
+            if len(batch) == batch_size:
+                if not put_batch(batch):
+                    return
+                batch = []
+
+        if batch:
+            put_batch(batch)
+    finally:
+        put_batch(None)
+
+
+def iterate_paths_parallel(subterranean: Network, allow_small_cave_twice: bool, split_depth: int = 3,
+                           workers: Optional[int] = None,
+                           batch_size: int = PATHS_BATCH_SIZE) -> Generator[List[str], None, None]:
+    """
+    Lazily yield every path from start to end, in no particular order.
+
+    The search is split at `split_depth` caves from start: each partial path of that length
+    is explored by a worker process, which streams its paths back through a bounded queue
+    by batches of at most `batch_size`. The network is sent once to every worker, and the
+    frontier is generated lazily with at most two pending partial paths per worker, so
+    neither the frontier nor a whole subtree is ever held in memory.
+    """
+    network = compile_network(subterranean)
+    frontier = walk_paths(network, initial_state(network, allow_small_cave_twice), frontier_length=split_depth + 1)
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = 2 * workers
+    batches = multiprocessing.Queue(maxsize=max_pending)
+    stop = multiprocessing.Event()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_subtree_worker,
+                             initargs=(network, batches, stop)) as executor:
+        futures = set()
+        unfinished = 0
+
+        def next_batch() -> List[List[str]]:
+            nonlocal unfinished
+
+            while True:
+                # a failed worker still ends its subtree, a dead one is only seen by its future
+                finished = {future for future in futures if future.done()}
+                for future in finished:
+                    future.result()
+                futures.difference_update(finished)
+
+                try:
+                    batch = batches.get(timeout=QUEUE_POLL_SECONDS)
+                except queue.Empty:
+                    continue
+
+                if batch is None:
+                    unfinished -= 1
+                    return []
+
+                return batch
+
+        try:
+            for complete, state in frontier:
+                if complete:
+                    yield network.path_names(state[0])
+                    continue
+
+                futures.add(executor.submit(stream_subtree, state, batch_size))
+                unfinished += 1
+                while unfinished >= max_pending:
+                    yield from next_batch()
+
+            while unfinished:
+                yield from next_batch()
+
+            # every subtree is ended, but a worker failure may not be recorded in its future yet
+            for future in futures:
+                future.result()
+        finally:
+            stop.set()
+            executor.shutdown(cancel_futures=True)
+
+
 def main():
     sub_example_1 = SubterraneanNetwork.load_from_file('input_test_1.txt')
     assert step_1(sub_example_1) == 10
@@ -160,6 +485,29 @@ def main():
     assert step_2(sub_example_2) == 103
     assert step_2(sub_network) == 128506
 
+    assert [count_paths(network, False) for network in (sub_example_1, sub_example_2, sub_example_3, sub_network)] == [
+        10, 19, 226, 5457
+    ]
+    assert [count_paths(network, True) for network in (sub_example_1, sub_example_2, sub_network)] == [
+        36, 103, 128506
+    ]
+
+    compiled_network = CompiledSubterraneanNetwork.load_from_file('input_test_4.txt')
+    assert step_1(compiled_network) == 5457
+    assert step_2(compiled_network) == 128506
+    assert count_paths(compiled_network, True) == 128506
+
+    assert list(iterate_paths(sub_example_1, False))[0][0] == 'start'
+    assert sum(1 for _ in iterate_paths(compiled_network, False)) == 5457
+    assert sum(1 for _ in iterate_paths(compiled_network, True)) == 128506
+
+    parallel_paths = sorted(map(tuple, iterate_paths_parallel(sub_example_3, True, split_depth=2, workers=4)))
+    assert parallel_paths == sorted(map(tuple, iterate_paths(sub_example_3, True)))
+    assert len(parallel_paths) == len(set(parallel_paths)) == 3509
+
+    batched_paths = sorted(map(tuple, iterate_paths_parallel(compiled_network, False, split_depth=1, workers=2, batch_size=7)))
+    assert batched_paths == sorted(map(tuple, iterate_paths(compiled_network, False)))
+
 
 if __name__ == '__main__':
     main()
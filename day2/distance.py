@@ -1,3 +1,26 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import reduce
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+CHUNK_SIZE = 1 << 24
+
+FORWARD = 0
+DOWN = 1
+UP = 2
+
+OPCODES = {
+    "forward": FORWARD,
+    "down": DOWN,
+    "up": UP,
+}
+
+INT64_LIMIT = 2 ** 63 - 1
+
+
 def find_position_1(movements):
     horizontal = 0
     depth = 0
@@ -30,6 +53,140 @@ def find_position_2(movements):
     return horizontal * depth
 
 
+@dataclass(frozen=True)
+class MovementSummary:
+    """
+    Effect of a sequence of commands on a submarine starting at the origin with zero aim.
+
+    The aim doubles as the depth of the first interpretation of the commands.
+    """
+    horizontal: int = 0
+    depth: int = 0
+    aim: int = 0
+
+    def followed_by(self, other: "MovementSummary") -> "MovementSummary":
+        return MovementSummary(
+            self.horizontal + other.horizontal,
+            self.depth + other.depth + self.aim * other.horizontal,
+            self.aim + other.aim
+        )
+
+    def position_1(self) -> int:
+        return self.horizontal * self.aim
+
+    def position_2(self) -> int:
+        return self.horizontal * self.depth
+
+
+def encode_movements(movements: List[Tuple[str, int]]) -> Tuple[np.ndarray, np.ndarray]:
+    opcodes = np.fromiter((OPCODES[direction] for direction, _ in movements), dtype=np.uint8, count=len(movements))
+    amounts = np.fromiter((amount for _, amount in movements), dtype=np.int64, count=len(movements))
+
+    return opcodes, amounts
+
+
+def parse_movements(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    for direction, opcode in OPCODES.items():
+        data = data.replace(direction.encode(), str(opcode).encode())
+
+    if not data.strip():
+        return np.empty(0, dtype=np.uint8), np.empty(0, dtype=np.int64)
+
+    commands = np.fromstring(data, dtype=np.int64, sep=' ').reshape(-1, 2)
+
+    return commands[:, 0].astype(np.uint8), commands[:, 1]
+
+
+def summarize_movements(opcodes: np.ndarray, amounts: np.ndarray) -> MovementSummary:
+    if opcodes.shape[0] == 0:
+        return MovementSummary()
+
+    if int(np.abs(amounts).max()) * opcodes.shape[0] > INT64_LIMIT:
+        amounts = amounts.astype(object)
+
+    forward = opcodes == FORWARD
+    aim_delta = np.where(opcodes == DOWN, amounts, 0) - np.where(opcodes == UP, amounts, 0)
+
+    forward_amounts = amounts[forward]
+    horizontal = int(forward_amounts.sum())
+
+    aim = np.cumsum(aim_delta)
+    aim_on_forward = aim[forward]
+
+    if aim_on_forward.shape[0] > 0 and int(np.abs(aim_on_forward).max()) * horizontal > INT64_LIMIT:
+        aim_on_forward = aim_on_forward.astype(object)
+        forward_amounts = forward_amounts.astype(object)
+
+    depth = int(np.dot(aim_on_forward, forward_amounts)) if aim_on_forward.shape[0] > 0 else 0
+
+    return MovementSummary(horizontal, depth, int(aim[-1]))
+
+
+def line_aligned_offsets(file_path: str, parts: int) -> List[int]:
+    file_size = os.path.getsize(file_path)
+    offsets = [0]
+
+    with open(file_path, 'rb') as fp:
+        for part in range(1, parts):
+            fp.seek(max(file_size * part // parts, offsets[-1]))
+            fp.readline()
+            offsets.append(min(fp.tell(), file_size))
+
+    offsets.append(file_size)
+
+    return sorted(set(offsets))
+
+
+def summarize_range(file_path: str, start: int, end: int, chunk_size: int = CHUNK_SIZE) -> MovementSummary:
+    summary = MovementSummary()
+    pending = b''
+
+    with open(file_path, 'rb') as fp:
+        fp.seek(start)
+        remaining = end - start
+
+        while remaining > 0 or pending:
+            data = fp.read(min(chunk_size, remaining)) if remaining > 0 else b''
+            remaining -= len(data)
+
+            data = pending + data
+            if remaining > 0:
+                cut = data.rfind(b'\n') + 1
+                data, pending = data[:cut], data[cut:]
+            else:
+                pending = b''
+
+            summary = summary.followed_by(summarize_movements(*parse_movements(data)))
+
+    return summary
+
+
+def summarize_movements_file(file_path: str, chunk_size: int = CHUNK_SIZE,
+                             workers: Optional[int] = None) -> MovementSummary:
+    """
+    Interpret a command log streaming it chunk by chunk.
+
+    Every chunk is reduced to a `MovementSummary` and the summaries are composed in file
+    order, so the log can also be split in line-aligned ranges handled by `workers` processes.
+    """
+    if workers is None or workers <= 1:
+        return summarize_range(file_path, 0, os.path.getsize(file_path), chunk_size)
+
+    offsets = line_aligned_offsets(file_path, workers)
+    ranges = list(zip(offsets[:-1], offsets[1:]))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        summaries = executor.map(
+            summarize_range,
+            [file_path] * len(ranges),
+            [start for start, _ in ranges],
+            [end for _, end in ranges],
+            [chunk_size] * len(ranges),
+        )
+
+        return reduce(MovementSummary.followed_by, summaries, MovementSummary())
+
+
 def main():
     def split_row(row):
         direction, amount = row.split(" ")
@@ -41,6 +198,14 @@ def main():
     assert find_position_1(movements) == 2322630
     assert find_position_2(movements) == 2105273490
 
+    summary = summarize_movements(*encode_movements(movements))
+    assert summary.position_1() == 2322630
+    assert summary.position_2() == 2105273490
+
+    assert summarize_movements_file("input.txt").position_2() == 2105273490
+    assert summarize_movements_file("input.txt", chunk_size=100, workers=4).position_1() == 2322630
+    assert summarize_movements_file("input.txt", chunk_size=100, workers=4).position_2() == 2105273490
+
 
 if __name__ == '__main__':
     main()
@@ -1,66 +1,126 @@
 import numpy as np
 
+from typing import Tuple
+
 
 def read_diagnosis_records():
     with open("input.txt", "r") as f:
         return [row.strip() for row in f.readlines()]
 
 
+def read_bit_matrix(file_path: str = "input.txt") -> np.ndarray:
+    """
+    Read the diagnostic report straight from the raw bytes as a uint8 matrix of bits.
+    """
+    raw = np.fromfile(file_path, dtype=np.uint8)
+    if raw.shape[0] == 0:
+        return np.empty((0, 0), dtype=np.uint8)
+
+    if raw[-1] != ord("\n"):
+        raw = np.append(raw, np.uint8(ord("\n")))
+
+    line_length = int(np.argmax(raw == ord("\n"))) + 1
+    record_width = line_length - 1
+    if record_width > 0 and raw[record_width - 1] == ord("\r"):
+        record_width -= 1
+
+    return raw.reshape(-1, line_length)[:, :record_width] - np.uint8(ord("0"))
+
+
+def records_to_bit_matrix(records: list) -> np.ndarray:
+    if len(records) == 0:
+        return np.empty((0, 0), dtype=np.uint8)
+
+    raw = np.frombuffer("".join(records).encode("ascii"), dtype=np.uint8)
+
+    return raw.reshape(len(records), -1) - np.uint8(ord("0"))
+
+
+def pack_records(bits: np.ndarray) -> np.ndarray:
+    """
+    Pack every record in big-endian bytes, left padded, so that the byte-wise order of the
+    rows matches the numeric order of the records whatever their width.
+    """
+    padding = -bits.shape[1] % 8
+
+    return np.packbits(np.pad(bits, ((0, 0), (padding, 0))), axis=1)
+
+
 def binary_to_int(binary_repr: np.ndarray) -> int:
-    power_of_two = np.array([2 ** pos for pos in reversed(range(binary_repr.shape[0]))])
+    packed = pack_records(np.asarray(binary_repr, dtype=np.uint8).reshape(1, -1))
+
+    return int.from_bytes(packed.tobytes(), "big")
+
 
-    return np.sum(binary_repr * power_of_two)
+def gamma_and_epsilon_rates(bits: np.ndarray) -> Tuple[int, int]:
+    num_of_records, num_of_bits = bits.shape
+    ones_count = bits.sum(axis=0, dtype=np.int64)
+
+    gamma = binary_to_int(ones_count * 2 > num_of_records)
+    # a column without a most common bit contributes to neither rate
+    tie = binary_to_int(ones_count * 2 == num_of_records)
+    epsilon = ((1 << num_of_bits) - 1) ^ gamma ^ tie
+
+    return gamma, epsilon
 
 
 def step_1(diagnosis_records: list) -> int:
-    def calculate_rate(records: list, bit: str) -> int:
-        def count_bit_at_pos(record: str, bit_to_count: str):
-            return np.fromiter((int(digit == bit_to_count) for digit in record), dtype=np.int64)
+    gamma, epsilon = gamma_and_epsilon_rates(records_to_bit_matrix(diagnosis_records))
 
-        bit_set_count = np.sum(
-            np.array(list(map(lambda record: count_bit_at_pos(record, bit), records))),
-            axis=0
-        )
-        power_of_two = np.array([2 ** pos for pos in reversed(range(bit_set_count.shape[0]))])
+    return gamma * epsilon
 
-        most_common_pos = np.where(
-            bit_set_count > len(records) / 2, 1, 0
-        )
 
-        return np.sum(most_common_pos * power_of_two)
+class DiagnosticIndex:
+    """
+    Diagnostic records sorted once by value.
 
-    return calculate_rate(diagnosis_records, "1") * calculate_rate(diagnosis_records, "0")
+    Records sharing a prefix are contiguous in the sorted order and, inside such a block,
+    the ones with the next bit unset come first. A bit criteria filter is therefore just a
+    `[lo, hi)` range narrowed by a binary search on one column, without copying any record.
+    """
 
+    def __init__(self, bits: np.ndarray):
+        packed = pack_records(bits)
+        order = np.argsort(packed.view(np.dtype((np.void, packed.shape[1]))).ravel(), kind="stable")
 
-def step_2(diagnosis_records: list) -> int:
-    def calculate_rating(records: np.ndarray, filter_on_most_common: bool) -> int:
-        rating = np.array(records)
-        num_of_bits = records.shape[1]
-        for pos in range(num_of_bits):
-            remaining = rating.shape[0]
-            if rating[:, pos].sum() >= remaining / 2:
-                bit_filter = 0 + int(filter_on_most_common)
-            else:
-                bit_filter = 1 - int(filter_on_most_common)
+        self.packed = packed[order]
+        # column-major, so every column slice searched below is contiguous
+        self.bits = np.asfortranarray(bits[order])
+        self.num_of_records, self.num_of_bits = bits.shape
+
+    def _split(self, lo: int, hi: int, pos: int) -> int:
+        return lo + int(np.searchsorted(self.bits[lo:hi, pos], 1))
+
+    def _record_to_int(self, record_pos: int) -> int:
+        return int.from_bytes(self.packed[record_pos].tobytes(), "big")
+
+    def rating(self, filter_on_most_common: bool) -> int:
+        lo, hi = 0, self.num_of_records
+        for pos in range(self.num_of_bits):
+            split = self._split(lo, hi, pos)
+            ones_count = hi - split
 
-            query = np.where(
-                rating[:, pos] == bit_filter
-            )
-            rating = rating[query]
+            if (ones_count * 2 >= hi - lo) == filter_on_most_common:
+                lo = split
+            else:
+                hi = split
 
-            if rating.shape[0] == 1:
-                return binary_to_int(rating[0])
+            if hi - lo == 1:
+                return self._record_to_int(lo)
 
         raise RuntimeError("I shouldn't be here")
 
-    binary_records = np.array([
-        np.fromiter(map(int, list(record)), dtype=np.int64)
-        for record in diagnosis_records
-    ])
+    def oxygen_generator_rating(self) -> int:
+        return self.rating(True)
+
+    def co2_scrubber_rating(self) -> int:
+        return self.rating(False)
 
-    oxygen_generator_rating = calculate_rating(binary_records, True)
-    co2_scrubber_rating = calculate_rating(binary_records, False)
-    return oxygen_generator_rating * co2_scrubber_rating
+
+def step_2(diagnosis_records: list) -> int:
+    index = DiagnosticIndex(records_to_bit_matrix(diagnosis_records))
+
+    return index.oxygen_generator_rating() * index.co2_scrubber_rating()
 
 
 if __name__ == '__main__':
@@ -69,3 +129,9 @@ if __name__ == '__main__':
     assert step_1(diagnosis) == 3242606
     assert step_2(diagnosis) == 4856080
 
+    bit_matrix = read_bit_matrix()
+    assert np.prod(gamma_and_epsilon_rates(bit_matrix)) == 3242606
+
+    diagnostic_index = DiagnosticIndex(bit_matrix)
+    assert diagnostic_index.oxygen_generator_rating() * diagnostic_index.co2_scrubber_rating() == 4856080
+
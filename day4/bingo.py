@@ -80,14 +80,11 @@ def read_numbers_and_boards() -> Tuple[BingoNumbers, Set[Board]]:
 def step_1() -> Optional[int]:
     numbers, boards = read_numbers_and_boards()
 
-    while len(numbers) > 0:
-        drawn = numbers.pop(0)
-        winner_boards = set()
+    for drawn in numbers:
         for board in boards:
             board.drawn_number(drawn)
 
             if board.bingo():
-                winner_boards.add(board)
                 return sum(board.get_unmarked()) * drawn
 
     return None
@@ -96,8 +93,7 @@ def step_1() -> Optional[int]:
 def step_2() -> Optional[int]:
     numbers, boards = read_numbers_and_boards()
 
-    while len(numbers) > 0:
-        drawn = numbers.pop(0)
+    for drawn in numbers:
         winner_boards = set()
         for board in boards:
             board.drawn_number(drawn)
@@ -113,6 +109,152 @@ def step_2() -> Optional[int]:
     return None
 
 
+def read_numbers_and_boards_array(file_path: str = "input.txt") -> Tuple[np.ndarray, np.ndarray]:
+    with open(file_path, "r") as f:
+        numbers = np.array([int(num) for num in f.readline().split(",")], dtype=np.int64)
+        cells = np.array(f.read().split(), dtype=np.int64)
+
+    return numbers, cells.reshape(-1, 5, 5)
+
+
+def compute_draw_turns(numbers: np.ndarray, boards: np.ndarray) -> np.ndarray:
+    """
+    Map every cell of the boards to the turn its number is drawn.
+
+    Numbers never drawn are mapped to `len(numbers)`, a turn that never happens.
+    """
+    drawn_numbers, first_turn = np.unique(numbers, return_index=True)
+    if drawn_numbers.shape[0] == 0:
+        return np.full(boards.shape, numbers.shape[0], dtype=np.int64)
+
+    pos = np.minimum(np.searchsorted(drawn_numbers, boards), drawn_numbers.shape[0] - 1)
+
+    return np.where(drawn_numbers[pos] == boards, first_turn[pos], numbers.shape[0])
+
+
+def compute_winning_turns(draw_turns: np.ndarray) -> np.ndarray:
+    """
+    A row (or column) is complete when its last number is drawn, a board wins as soon as
+    its first row or column is complete.
+    """
+    return np.minimum(
+        draw_turns.max(axis=2).min(axis=1),
+        draw_turns.max(axis=1).min(axis=1)
+    )
+
+
+def play_tournament(numbers: np.ndarray, boards: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Play the whole game at once.
+
+    :return: the indices of the winner boards, sorted by winning turn, and their scores
+    """
+    draw_turns = compute_draw_turns(numbers, boards)
+    winning_turns = compute_winning_turns(draw_turns)
+
+    winners = np.argsort(winning_turns, kind="stable")
+    winners = winners[winning_turns[winners] < numbers.shape[0]]
+    winning_turns = winning_turns[winners]
+
+    unmarked = draw_turns[winners] > winning_turns[:, np.newaxis, np.newaxis]
+    unmarked_sum = (boards[winners] * unmarked).sum(axis=(1, 2))
+
+    return winners, unmarked_sum * numbers[winning_turns]
+
+
+class BingoTournament:
+    """
+    Live game over a stack of boards, fed one draw at a time.
+
+    Every cell is addressed by its flat position in the stacked boards. The positions are
+    sorted by number, so the cells holding a number are a contiguous slice found with a
+    binary search, and a draw only touches the boards that actually contain it.
+    """
+
+    def __init__(self, boards: np.ndarray):
+        self.boards = boards
+        self.num_of_boards, self.numbers_on_axis, _ = boards.shape
+
+        flat_numbers = boards.ravel()
+        self.cells_by_number = np.argsort(flat_numbers, kind="stable")
+        self.sorted_numbers = flat_numbers[self.cells_by_number]
+
+        self.marked = np.zeros(flat_numbers.shape[0], dtype=bool)
+        self.drawn_numbers_in_row = np.zeros(self.num_of_boards * self.numbers_on_axis, dtype=np.int32)
+        self.drawn_numbers_in_col = np.zeros(self.num_of_boards * self.numbers_on_axis, dtype=np.int32)
+
+        self.unmarked_sum = boards.sum(axis=(1, 2))
+        self.winner = np.zeros(self.num_of_boards, dtype=bool)
+        self.winning_score = np.zeros(self.num_of_boards, dtype=self.unmarked_sum.dtype)
+
+    def _cells_of(self, drawn: int) -> np.ndarray:
+        lo = np.searchsorted(self.sorted_numbers, drawn, side="left")
+        hi = np.searchsorted(self.sorted_numbers, drawn, side="right")
+
+        cells = self.cells_by_number[lo:hi]
+
+        return cells[~self.marked[cells]]
+
+    def drawn_number(self, drawn: int) -> np.ndarray:
+        """
+        Drawn a number and mark the boards including it.
+
+        :param drawn: new number drawn during the game
+        :return: the boards that won with this draw, sorted by index
+        """
+        cells = self._cells_of(drawn)
+        if cells.shape[0] == 0:
+            return np.empty(0, dtype=np.int64)
+
+        self.marked[cells] = True
+
+        board, board_cell = np.divmod(cells, self.numbers_on_axis ** 2)
+        row, col = np.divmod(board_cell, self.numbers_on_axis)
+        row_key = board * self.numbers_on_axis + row
+        col_key = board * self.numbers_on_axis + col
+
+        np.add.at(self.drawn_numbers_in_row, row_key, 1)
+        np.add.at(self.drawn_numbers_in_col, col_key, 1)
+        np.subtract.at(self.unmarked_sum, board, drawn)
+
+        completed = (
+            (self.drawn_numbers_in_row[row_key] == self.numbers_on_axis)
+            | (self.drawn_numbers_in_col[col_key] == self.numbers_on_axis)
+        )
+
+        new_winners = np.unique(board[completed])
+        new_winners = new_winners[~self.winner[new_winners]]
+
+        self.winner[new_winners] = True
+        self.winning_score[new_winners] = self.unmarked_sum[new_winners] * drawn
+
+        return new_winners
+
+    def drawn_numbers(self, numbers: BingoNumbers) -> np.ndarray:
+        """
+        Drawn a batch of numbers in order.
+
+        :return: the boards that won during the batch, in winning order
+        """
+        new_winners = [self.drawn_number(drawn) for drawn in numbers]
+
+        return np.concatenate(new_winners) if new_winners else np.empty(0, dtype=np.int64)
+
+    def scores(self, boards: np.ndarray) -> np.ndarray:
+        return self.winning_score[boards]
+
+
 if __name__ == '__main__':
     assert step_1() == 2745
     assert step_2() == 6594
+
+    _, scores = play_tournament(*read_numbers_and_boards_array())
+    assert scores[0] == 2745
+    assert scores[-1] == 6594
+
+    bingo_numbers, bingo_boards = read_numbers_and_boards_array()
+    tournament = BingoTournament(bingo_boards)
+    first_winners = tournament.drawn_numbers(bingo_numbers[:30])
+    other_winners = tournament.drawn_numbers(bingo_numbers[30:])
+    assert tournament.scores(first_winners)[0] == 2745
+    assert tournament.scores(other_winners)[-1] == 6594
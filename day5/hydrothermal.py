@@ -1,6 +1,8 @@
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import Tuple, List, Generator
+from itertools import combinations
+from typing import Tuple, List, Generator, Optional
 
 Segment = Tuple["Point", "Point"]
 
@@ -26,9 +28,77 @@ class Point:
         return self.x == other.x and self.y == other.y
 
 
+RASTER_CHUNK_SIZE = 1 << 16
+
+
+def counter_dtype(num_of_segments: int) -> np.dtype:
+    """
+    Smallest unsigned dtype able to count a cell covered by every segment.
+    """
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if num_of_segments <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+
+    return np.dtype(np.uint64)
+
+
+def covered_cells(segments: np.ndarray, size: int) -> np.ndarray:
+    """
+    Linear indices, row by row, of every cell covered by the segments.
+
+    :param segments: (n, 4) array of x1, y1, x2, y2
+    """
+    x1, y1, x2, y2 = segments.T
+    x_step, y_step = np.sign(x2 - x1), np.sign(y2 - y1)
+    lengths = np.maximum(np.abs(x2 - x1), np.abs(y2 - y1)) + 1
+
+    segment_of_cell = np.repeat(np.arange(segments.shape[0]), lengths)
+    first_cell = np.cumsum(lengths) - lengths
+    step = np.arange(segment_of_cell.shape[0]) - np.repeat(first_cell, lengths)
+
+    xs = x1[segment_of_cell] + x_step[segment_of_cell] * step
+    ys = y1[segment_of_cell] + y_step[segment_of_cell] * step
+
+    return ys * size + xs
+
+
+def rasterize_segments(segments: np.ndarray, size: int, dtype: np.dtype) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :return: the linear indices of the cells covered by the segments and how many segments
+        cover each of them, sparse so that no dense grid is built per chunk
+    """
+    cells, counts = np.unique(covered_cells(segments, size), return_counts=True)
+
+    return cells, counts.astype(dtype)
+
+
 class Grid:
-    def __init__(self, size: int):
-        self.matrix = np.full((size, size), 0)
+    def __init__(self, size: int, dtype: np.dtype = np.int64):
+        self.matrix = np.full((size, size), 0, dtype=dtype)
+
+    def draw_lines(self, segments: np.ndarray, chunk_size: int = RASTER_CHUNK_SIZE, workers: Optional[int] = None):
+        """
+        Draw all the segments at once, accumulating the covered cells of every chunk of
+        segments with a single scatter add.
+
+        :param segments: (n, 4) array of x1, y1, x2, y2
+        :param workers: when greater than one, the chunks are rasterized by a process pool
+            and their sparse partial counts summed here
+        """
+        size = self.matrix.shape[0]
+        flat_matrix = self.matrix.reshape(-1)
+        chunks = [segments[start:start + chunk_size] for start in range(0, segments.shape[0], chunk_size)]
+
+        if workers is None or workers <= 1:
+            for cells, counts in (rasterize_segments(chunk, size, self.matrix.dtype) for chunk in chunks):
+                np.add.at(flat_matrix, cells, counts)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for cells, counts in executor.map(
+                    rasterize_segments, chunks, [size] * len(chunks), [self.matrix.dtype] * len(chunks)
+            ):
+                np.add.at(flat_matrix, cells, counts)
 
     def draw_line(self, segment: Segment):
         if segment[0].x == segment[1].x:
@@ -98,13 +168,205 @@ def is_straight(segment: Segment) -> bool:
     )
 
 
+LineDirection = Tuple[int, int, int]
+
+# the points of a segment lie on the line `a * x + b * y = key` and are identified by a
+# single parameter, their x or y coordinate, so overlaps become overlaps of intervals
+HORIZONTAL = (0, 1, 0)  # (a, b, parameter axis)
+VERTICAL = (1, 0, 1)
+DIAGONAL = (-1, 1, 0)
+ANTI_DIAGONAL = (1, 1, 0)
+
+LINE_DIRECTIONS = (HORIZONTAL, VERTICAL, DIAGONAL, ANTI_DIAGONAL)
+
+INTERSECTION_BLOCK_SIZE = 1 << 20
+
+
+@dataclass
+class LineIntervals:
+    """
+    Disjoint `[start, end)` intervals on the lines of one direction, sorted by (key, start),
+    each one labelled with the number of segments covering it.
+    """
+    direction: LineDirection
+    keys: np.ndarray
+    starts: np.ndarray
+    ends: np.ndarray
+    coverage: np.ndarray
+
+    def select(self, min_coverage: int) -> "LineIntervals":
+        selected = self.coverage >= min_coverage
+
+        return LineIntervals(
+            self.direction, self.keys[selected], self.starts[selected], self.ends[selected], self.coverage[selected]
+        )
+
+    def length(self) -> int:
+        return int((self.ends - self.starts).sum())
+
+    def keys_and_params(self, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        a, b, axis = self.direction
+
+        return a * xs + b * ys, ys if axis else xs
+
+    def contains(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        if self.keys.shape[0] == 0:
+            return np.zeros(xs.shape[0], dtype=bool)
+
+        keys, params = self.keys_and_params(xs, ys)
+        num_of_intervals = self.keys.shape[0]
+
+        # merge intervals and points in one lexicographic order: the interval holding a
+        # point, if any, is the last interval preceding it
+        order = np.lexsort((
+            np.concatenate((np.zeros(num_of_intervals, dtype=np.int8), np.ones(keys.shape[0], dtype=np.int8))),
+            np.concatenate((self.starts, params)),
+            np.concatenate((self.keys, keys)),
+        ))
+        preceding = np.maximum.accumulate(np.where(order < num_of_intervals, order, -1))
+
+        is_point = order >= num_of_intervals
+        candidate = np.empty(keys.shape[0], dtype=np.int64)
+        candidate[order[is_point] - num_of_intervals] = preceding[is_point]
+
+        found = candidate >= 0
+        candidate = np.maximum(candidate, 0)
+
+        return found & (self.keys[candidate] == keys) & (params < self.ends[candidate])
+
+
+def segments_to_array(segments: List[Segment]) -> np.ndarray:
+    return np.array(
+        [(seg[0].x, seg[0].y, seg[1].x, seg[1].y) for seg in segments], dtype=np.int64
+    ).reshape(-1, 4)
+
+
+def sweep_line_intervals(segments: np.ndarray, direction: LineDirection) -> LineIntervals:
+    """
+    Sweep the segments lying along `direction`, line by line, and split every line in
+    intervals of constant coverage.
+
+    :param segments: (n, 4) array of x1, y1, x2, y2
+    """
+    x1, y1, x2, y2 = segments.T
+    vertical = x1 == x2
+    horizontal = (y1 == y2) & ~vertical
+    diagonal = ~vertical & ~horizontal & ((x2 - x1) * (y2 - y1) > 0)
+    anti_diagonal = ~vertical & ~horizontal & ~diagonal
+
+    selected = {
+        HORIZONTAL: horizontal,
+        VERTICAL: vertical,
+        DIAGONAL: diagonal,
+        ANTI_DIAGONAL: anti_diagonal,
+    }[direction]
+
+    a, b, axis = direction
+    keys = a * x1[selected] + b * y1[selected]
+    first, second = (y1, y2) if axis else (x1, x2)
+    first, second = first[selected], second[selected]
+
+    event_keys = np.concatenate((keys, keys))
+    event_params = np.concatenate((np.minimum(first, second), np.maximum(first, second) + 1))
+    event_deltas = np.concatenate((np.ones(keys.shape[0], dtype=np.int64), np.full(keys.shape[0], -1)))
+
+    order = np.lexsort((event_params, event_keys))
+    event_keys = event_keys[order]
+    event_params = event_params[order]
+    coverage = np.cumsum(event_deltas[order])
+
+    # every event opens an interval ending at the next event on the same line
+    not_empty = (
+        (event_keys[:-1] == event_keys[1:])
+        & (event_params[:-1] < event_params[1:])
+        & (coverage[:-1] > 0)
+    )
+
+    return LineIntervals(
+        direction,
+        event_keys[:-1][not_empty],
+        event_params[:-1][not_empty],
+        event_params[1:][not_empty],
+        coverage[:-1][not_empty],
+    )
+
+
+def intersect_line_intervals(first: LineIntervals, second: LineIntervals) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Test every pair of intervals on two different directions for a common integer point.
+
+    The pairs are tested in blocks of rows, so memory stays bounded.
+    """
+    a1, b1, _ = first.direction
+    a2, b2, _ = second.direction
+    det = a1 * b2 - a2 * b1
+    assert det != 0
+
+    intersection_xs, intersection_ys = [], []
+    block_rows = max(1, INTERSECTION_BLOCK_SIZE // max(1, second.keys.shape[0]))
+
+    for block_start in range(0, first.keys.shape[0], block_rows):
+        block = slice(block_start, block_start + block_rows)
+        first_keys = first.keys[block, np.newaxis]
+
+        x_num = first_keys * b2 - second.keys * b1
+        y_num = a1 * second.keys - a2 * first_keys
+        xs, ys = x_num // det, y_num // det
+
+        _, first_params = first.keys_and_params(xs, ys)
+        _, second_params = second.keys_and_params(xs, ys)
+
+        valid = (
+            (x_num % det == 0) & (y_num % det == 0)
+            & (first.starts[block, np.newaxis] <= first_params) & (first_params < first.ends[block, np.newaxis])
+            & (second.starts <= second_params) & (second_params < second.ends)
+        )
+
+        intersection_xs.append(xs[valid])
+        intersection_ys.append(ys[valid])
+
+    if len(intersection_xs) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    return np.concatenate(intersection_xs), np.concatenate(intersection_ys)
+
+
+def count_overlapping_points(segments: np.ndarray) -> int:
+    """
+    Count the points covered by at least two segments without drawing them on a grid.
+
+    Overlaps between segments on the same line come from a sweep over their intervals,
+    overlaps between different directions from the pairwise intersections of the covered
+    intervals. Points found by both are counted once.
+    """
+    intervals = [sweep_line_intervals(segments, direction) for direction in LINE_DIRECTIONS]
+    covered = [line_intervals.select(1) for line_intervals in intervals]
+    overlapped = [line_intervals.select(2) for line_intervals in intervals]
+
+    crossings = [intersect_line_intervals(first, second) for first, second in combinations(covered, 2)]
+    crossing_points = np.unique(
+        np.stack((
+            np.concatenate([xs for xs, _ in crossings]),
+            np.concatenate([ys for _, ys in crossings]),
+        ), axis=1),
+        axis=0
+    )
+    xs, ys = crossing_points[:, 0], crossing_points[:, 1]
+
+    return (
+        sum(line_intervals.length() for line_intervals in overlapped)
+        + crossing_points.shape[0]
+        - sum(int(line_intervals.contains(xs, ys).sum()) for line_intervals in overlapped)
+    )
+
+
 def create_grid(segments: List[Segment]) -> Grid:
     def max_axis_value(seg: Segment):
         return max((seg[0].x, seg[0].y, seg[1].x, seg[1].y))
 
     shape = max(map(max_axis_value, segments)) + 1
 
-    return Grid(shape)
+    return Grid(shape, counter_dtype(len(segments)))
 
 
 if __name__ == '__main__':
@@ -122,3 +384,17 @@ if __name__ == '__main__':
         grid.draw_line(seg)
 
     assert grid.get_num_of_interception() == 19081
+
+    segments_array = segments_to_array(hydrothermal_vents)
+    straight = (segments_array[:, 0] == segments_array[:, 2]) | (segments_array[:, 1] == segments_array[:, 3])
+
+    assert count_overlapping_points(segments_array[straight]) == 6666
+    assert count_overlapping_points(segments_array) == 19081
+
+    grid.reset()
+    grid.draw_lines(segments_array[straight])
+    assert grid.get_num_of_interception() == 6666
+
+    grid.reset()
+    grid.draw_lines(segments_array, chunk_size=64, workers=4)
+    assert grid.get_num_of_interception() == 19081
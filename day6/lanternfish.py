@@ -1,6 +1,7 @@
 import numpy as np
 
-from typing import List, Any
+from collections import OrderedDict
+from typing import List, Any, Tuple
 
 
 def load_initial_fishes() -> List[int]:
@@ -28,6 +29,130 @@ def compute_population_after_days(initial_fishes: List[int], days: int) -> int:
     return fish_of_age.sum()
 
 
+def lifecycle_matrix(reset_age: int = 6, newborn_age: int = 8) -> np.ndarray:
+    """
+    Matrix moving the count of fishes of each age to the following day.
+
+    Entries are Python integers, so products of the matrix never overflow.
+    """
+    assert 0 <= reset_age <= newborn_age
+
+    matrix = np.zeros((newborn_age + 1, newborn_age + 1), dtype=object)
+    for age in range(1, newborn_age + 1):
+        matrix[age - 1, age] = 1
+
+    matrix[reset_age, 0] += 1
+    matrix[newborn_age, 0] += 1
+
+    return matrix
+
+
+def matrix_power(matrix: np.ndarray, exponent: int) -> np.ndarray:
+    result = np.identity(matrix.shape[0], dtype=int).astype(object)
+
+    while exponent > 0:
+        if exponent & 1:
+            result = result.dot(matrix)
+        matrix = matrix.dot(matrix)
+        exponent >>= 1
+
+    return result
+
+
+def count_fishes_of_age(initial_fishes: List[int], newborn_age: int = 8) -> np.ndarray:
+    return np.bincount(initial_fishes, minlength=newborn_age + 1).astype(object)
+
+
+def compute_exact_population_after_days(initial_fishes: List[int], days: int,
+                                        reset_age: int = 6, newborn_age: int = 8) -> int:
+    """
+    Population after `days`, raising the lifecycle matrix to the power of `days` by
+    repeated squaring: O(log days) matrix products on exact integers.
+    """
+    transition = matrix_power(lifecycle_matrix(reset_age, newborn_age), days)
+    fish_of_age = transition.dot(count_fishes_of_age(initial_fishes, newborn_age))
+
+    return int(fish_of_age.sum())
+
+
+class PopulationForecaster:
+    """
+    Answer many population queries against the same lifecycle rules.
+
+    The contribution of a single fish of each age after `days` (the sum of the columns of
+    the lifecycle matrix raised to `days`) is shared by every school, so it is computed
+    once from the cached powers of two of the matrix and kept in a bounded LRU cache.
+    """
+
+    def __init__(self, reset_age: int = 6, newborn_age: int = 8, cache_size: int = 128):
+        assert cache_size > 0
+
+        self.reset_age = reset_age
+        self.newborn_age = newborn_age
+        self.cache_size = cache_size
+
+        self._squared_powers = [lifecycle_matrix(reset_age, newborn_age)]
+        self._contributions = OrderedDict()  # type: OrderedDict[int, np.ndarray]
+
+    def _power_of_two(self, exponent: int) -> np.ndarray:
+        while len(self._squared_powers) <= exponent:
+            self._squared_powers.append(self._squared_powers[-1].dot(self._squared_powers[-1]))
+
+        return self._squared_powers[exponent]
+
+    def contributions(self, days: int) -> np.ndarray:
+        if days in self._contributions:
+            self._contributions.move_to_end(days)
+            return self._contributions[days]
+
+        contributions = np.ones(self.newborn_age + 1, dtype=int).astype(object)
+        for exponent in range(days.bit_length()):
+            if days >> exponent & 1:
+                contributions = contributions.dot(self._power_of_two(exponent))
+
+        self._contributions[days] = contributions
+        if len(self._contributions) > self.cache_size:
+            self._contributions.popitem(last=False)
+
+        return contributions
+
+    def forecast(self, queries: List[Tuple[List[int], int]]) -> List[int]:
+        """
+        :param queries: pairs of initial fishes and days
+        :return: the population for every query, in order
+        """
+        if len(queries) == 0:
+            return []
+
+        fish_of_age = np.stack([count_fishes_of_age(fishes, self.newborn_age) for fishes, _ in queries])
+        contributions = {days: self.contributions(days) for days in set(days for _, days in queries)}
+        query_contributions = np.stack([contributions[days] for _, days in queries])
+
+        return [int(population) for population in (fish_of_age * query_contributions).sum(axis=1)]
+
+    def contributions_series(self, days: int) -> np.ndarray:
+        """
+        Contributions on every day from 0 to `days` included. The series is built for the
+        call only and never cached, so it does not outlive the caller.
+        """
+        series = np.empty((days + 1, self.newborn_age + 1), dtype=object)
+        series[0] = 1
+
+        # a fish of age a > 0 behaves as one of age a - 1 a day later, one of age 0
+        # becomes a fish of reset age and a newborn
+        for day in range(1, days + 1):
+            series[day, 1:] = series[day - 1, :-1]
+            series[day, 0] = series[day - 1, self.reset_age] + series[day - 1, self.newborn_age]
+
+        return series
+
+    def population_series(self, initial_fishes: List[int], days: int) -> np.ndarray:
+        """
+        :return: the population on every day from 0 to `days` included
+        """
+        return self.contributions_series(days).dot(count_fishes_of_age(initial_fishes, self.newborn_age))
+
+
 if __name__ == '__main__':
     assert compute_population_after_days([3, 4, 3, 1, 2], 18) == 26
     assert compute_population_after_days([3, 4, 3, 1, 2], 80) == 5934
@@ -38,4 +163,18 @@ if __name__ == '__main__':
     assert compute_population_after_days(initial_population, 80) == 361169
     assert compute_population_after_days(initial_population, 256) == 1634946868992
 
+    assert compute_exact_population_after_days([3, 4, 3, 1, 2], 18) == 26
+    assert compute_exact_population_after_days(initial_population, 256) == 1634946868992
+    assert compute_exact_population_after_days([0], 1) == 2
+
+    forecaster = PopulationForecaster(cache_size=2)
+    assert forecaster.forecast([
+        ([3, 4, 3, 1, 2], 18), ([3, 4, 3, 1, 2], 80), (initial_population, 80), (initial_population, 256)
+    ]) == [26, 5934, 361169, 1634946868992]
+
+    example_series = forecaster.population_series([3, 4, 3, 1, 2], 256)
+    assert example_series[0] == 5
+    assert example_series[18] == 26
+    assert example_series[256] == 26984457539
+
 
@@ -1,6 +1,72 @@
+import enum
+from enum import auto
+
 import numpy as np
 
-from typing import Callable, List
+from typing import Callable, List, Optional
+
+Distance = Callable[[int, int], int]
+VectorizedDistance = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+CURVE_BLOCK_SIZE = 1 << 20
+
+INT64_LIMIT = 2 ** 63 - 1
+
+
+class CostKind(enum.Enum):
+    LINEAR = auto()
+    TRIANGULAR = auto()
+    CONVEX = auto()
+
+
+def declare_cost(kind: CostKind) -> Callable[[Distance], Distance]:
+    """
+    Declare the shape of the fuel consumption of a distance, so that the cheapest position
+    can be found without trying every position.
+    """
+    def decorator(distance: Distance) -> Distance:
+        distance.cost_kind = kind
+        return distance
+
+    return decorator
+
+
+def declare_vectorized(vectorized: VectorizedDistance) -> Callable[[Distance], Distance]:
+    """
+    Attach to a distance its numpy form, computing the distances between broadcast arrays
+    of crab positions and positions with integer arithmetic.
+    """
+    def decorator(distance: Distance) -> Distance:
+        distance.vectorized = vectorized
+        return distance
+
+    return decorator
+
+
+def vectorized_unit_distance(crab_positions: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    return np.abs(crab_positions - positions)
+
+
+def vectorized_incremental_distance(crab_positions: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    dist = np.abs(crab_positions - positions)
+    if dist.size > 0 and int(dist.max()) * (int(dist.max()) + 1) > INT64_LIMIT:
+        dist = dist.astype(object)
+
+    return (dist * (dist + 1)) // 2
+
+
+@declare_cost(CostKind.LINEAR)
+@declare_vectorized(vectorized_unit_distance)
+def unit_distance(crab_position, position):
+    return abs(crab_position - position)
+
+
+@declare_cost(CostKind.TRIANGULAR)
+@declare_vectorized(vectorized_incremental_distance)
+def incremental_distance(crab_position, position):
+    dist = abs(crab_position - position)
+
+    return (dist * (dist + 1)) // 2
 
 
 def read_crabs_positions() -> np.array:
@@ -8,7 +74,146 @@ def read_crabs_positions() -> np.array:
         return list(map(int, f.readline().split(',')))
 
 
-def find_cheapest_position(crabs_positions: List[int], distance: Callable[[int, int], int]) -> int:
+class PositionsHistogram:
+    """
+    Crabs grouped by position, sorted, with the prefix sums needed to get the linear and
+    the triangular fuel consumption at any position in O(log n) time.
+    """
+
+    def __init__(self, crabs_positions: List[int]):
+        self.positions, counts = np.unique(np.asarray(crabs_positions, dtype=np.int64), return_counts=True)
+        self.counts = counts.astype(np.int64)
+
+        self.min_pos = int(self.positions[0])
+        self.max_pos = int(self.positions[-1])
+
+        # the sums of the squared positions are computed with exact integers when they may overflow
+        weighted_positions = self.positions
+        if int(self.counts.sum()) * max(abs(self.min_pos), abs(self.max_pos)) ** 2 > INT64_LIMIT:
+            weighted_positions = self.positions.astype(object)
+
+        self.count_prefix = np.concatenate(([0], np.cumsum(self.counts)))
+        self.sum_prefix = np.concatenate(([0], np.cumsum(self.counts * weighted_positions)))
+        self.total_squares = int((self.counts * weighted_positions * weighted_positions).sum())
+
+    def linear_cost(self, position: int) -> int:
+        split = int(np.searchsorted(self.positions, position))
+
+        count_left, count_right = int(self.count_prefix[split]), int(self.count_prefix[-1] - self.count_prefix[split])
+        sum_left, sum_right = int(self.sum_prefix[split]), int(self.sum_prefix[-1] - self.sum_prefix[split])
+
+        return position * count_left - sum_left + sum_right - position * count_right
+
+    def triangular_cost(self, position: int) -> int:
+        # sum of d * (d + 1) / 2, with d ** 2 = (crab - position) ** 2 needing no split
+        squares = self.total_squares - 2 * position * int(self.sum_prefix[-1]) + position ** 2 * int(self.count_prefix[-1])
+
+        return (squares + self.linear_cost(position)) // 2
+
+    def cost(self, position: int, distance: Distance) -> int:
+        vectorized = getattr(distance, 'vectorized', None)
+        if vectorized is not None:
+            distances = vectorized(self.positions, np.int64(position))
+            return int((self.weights_for(int(distances.max())) * distances).sum())
+
+        return sum(
+            int(count) * distance(int(crab), position) for crab, count in zip(self.positions, self.counts)
+        )
+
+    def weights_for(self, max_distance: int) -> np.ndarray:
+        """
+        Crab counts to weight distances up to `max_distance` with, as exact integers when the
+        weighted sum may overflow int64.
+        """
+        if int(self.count_prefix[-1]) * max_distance > INT64_LIMIT:
+            return self.counts.astype(object)
+
+        return self.counts
+
+    def cost_curve(self, distance: Distance, block_size: int = CURVE_BLOCK_SIZE) -> np.ndarray:
+        """
+        Fuel consumption at every position from the leftmost to the rightmost crab.
+
+        Distances with a vectorized form are broadcast between a block of the histogram and a
+        block of positions at a time, holding at most `block_size` distances in memory. The
+        distance is expected to grow with the gap, so the largest one is between the leftmost
+        and the rightmost crab; the curve holds exact integers when it may overflow int64.
+        """
+        all_positions = np.arange(self.min_pos, self.max_pos + 1, dtype=np.int64)
+
+        vectorized = getattr(distance, 'vectorized', None)
+        if vectorized is None:
+            return np.array([self.cost(int(pos), distance) for pos in all_positions])
+
+        max_distance = int(vectorized(np.int64(self.min_pos), np.int64(self.max_pos)))
+        weights = self.weights_for(max_distance)
+
+        curve = np.zeros(all_positions.shape[0], dtype=weights.dtype)
+        crabs_per_block = max(1, min(self.positions.shape[0], block_size))
+        positions_per_block = max(1, block_size // crabs_per_block)
+
+        for start in range(0, all_positions.shape[0], positions_per_block):
+            block = all_positions[start:start + positions_per_block]
+
+            for crabs_start in range(0, self.positions.shape[0], crabs_per_block):
+                crabs = slice(crabs_start, crabs_start + crabs_per_block)
+                distances = vectorized(self.positions[crabs, np.newaxis], block[np.newaxis, :])
+                curve[start:start + block.shape[0]] += (weights[crabs, np.newaxis] * distances).sum(axis=0)
+
+        return curve
+
+    def median(self) -> int:
+        lower_median = (int(self.count_prefix[-1]) - 1) // 2
+
+        return int(self.positions[np.searchsorted(self.count_prefix, lower_median, side='right') - 1])
+
+    def mean(self) -> float:
+        return int(self.sum_prefix[-1]) / int(self.count_prefix[-1])
+
+
+def ternary_search(cost: Callable[[int], int], lo: int, hi: int) -> int:
+    """
+    Minimum of a convex function over the integers in [lo, hi].
+    """
+    while hi - lo > 2:
+        first = lo + (hi - lo) // 3
+        second = hi - (hi - lo) // 3
+
+        first_cost, second_cost = cost(first), cost(second)
+        if first_cost < second_cost:
+            hi = second - 1
+        elif first_cost > second_cost:
+            lo = first + 1
+        else:
+            lo, hi = first, second
+
+    return min(cost(pos) for pos in range(lo, hi + 1))
+
+
+def find_declared_cheapest_position(crabs_positions: List[int], kind: CostKind,
+                                    distance: Optional[Distance] = None) -> int:
+    histogram = PositionsHistogram(crabs_positions)
+
+    match kind:
+        case CostKind.LINEAR:
+            return histogram.linear_cost(histogram.median())
+        case CostKind.TRIANGULAR:
+            # the optimum is less than one position away from the mean
+            mean = int(np.floor(histogram.mean()))
+            candidates = range(max(histogram.min_pos, mean - 1), min(histogram.max_pos, mean + 2) + 1)
+
+            return min(histogram.triangular_cost(pos) for pos in candidates)
+        case _:
+            return ternary_search(
+                lambda pos: histogram.cost(pos, distance), histogram.min_pos, histogram.max_pos
+            )
+
+
+def find_cheapest_position(crabs_positions: List[int], distance: Distance) -> int:
+    kind = getattr(distance, 'cost_kind', None)
+    if kind is not None:
+        return find_declared_cheapest_position(crabs_positions, kind, distance)
+
     min_pos = min(crabs_positions)
     max_pos = max(crabs_positions)
 
@@ -18,20 +223,41 @@ def find_cheapest_position(crabs_positions: List[int], distance: Callable[[int,
     return min(fuel_consumption(pos) for pos in range(min_pos, max_pos + 1))
 
 
+def compute_fuel_curve(crabs_positions: List[int], distance: Distance, block_size: int = CURVE_BLOCK_SIZE) -> np.ndarray:
+    return PositionsHistogram(crabs_positions).cost_curve(distance, block_size)
+
+
 if __name__ == '__main__':
     crabs_positions = read_crabs_positions()
     test_positions = np.array([16, 1, 2, 0, 4, 2, 7, 1, 2, 14])
 
-    def unit_distance(crab_position, position):
-        return abs(crab_position - position)
-
     assert find_cheapest_position(test_positions, unit_distance) == 37
     assert find_cheapest_position(crabs_positions, unit_distance) == 328318
 
-    def incremental_distance(crab_position, position):
-        dist = abs(crab_position - position)
-
-        return (dist * (dist + 1)) / 2
-
     assert find_cheapest_position(test_positions, incremental_distance) == 168
     assert find_cheapest_position(crabs_positions, incremental_distance) == 89791146
+
+    @declare_cost(CostKind.CONVEX)
+    def convex_incremental_distance(crab_position, position):
+        return incremental_distance(crab_position, position)
+
+    def undeclared_incremental_distance(crab_position, position):
+        return incremental_distance(crab_position, position)
+
+    assert find_cheapest_position(test_positions, convex_incremental_distance) == 168
+    assert find_cheapest_position(crabs_positions, convex_incremental_distance) == 89791146
+    assert find_cheapest_position(test_positions, undeclared_incremental_distance) == 168
+
+    test_curve = compute_fuel_curve(test_positions, incremental_distance)
+    assert test_curve.shape[0] == 17
+    assert test_curve[5] == 168
+    assert compute_fuel_curve(crabs_positions, unit_distance, block_size=4096).min() == 328318
+    assert (compute_fuel_curve(test_positions, incremental_distance, block_size=3) == test_curve).all()
+    assert compute_fuel_curve(crabs_positions, incremental_distance).min() == 89791146
+    assert (compute_fuel_curve(test_positions, undeclared_incremental_distance) == test_curve).all()
+
+    assert find_cheapest_position([0, 1] + [4_000_000] * 1_000_000, incremental_distance) == 15999972000049
+
+    wide_curve = compute_fuel_curve([0] * 1_000_000 + [5_000_000], incremental_distance)
+    assert wide_curve[-1] == 12500002500000000000
+    assert wide_curve[0] == 12500002500000
@@ -1,5 +1,10 @@
-from typing import List, Set, Tuple, Union, Dict
-from collections import Counter
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from typing import List, Set, Tuple, Union, Dict, Optional, Generator
+from collections import Counter, OrderedDict
 
 SignalPattern = Set[str]
 PrintedSegments = Set[str]
@@ -149,11 +154,55 @@ class SignalDecoder:
         return ''.join(map(translate_single_segment, segments))  # noqa
 
 
+class DecoderCache:
+    """
+    Bounded LRU cache of the decoders, keyed by the sorted bitmasks of the ten patterns, so
+    that displays sharing the same wiring are decoded only once.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        assert max_size > 0
+
+        self.max_size = max_size
+        self.decoders = OrderedDict()  # type: OrderedDict[Tuple[int, ...], SignalDecoder]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def canonical_key(patterns: List[SignalPattern]) -> Tuple[int, ...]:
+        return tuple(sorted(map(pattern_to_mask, patterns)))
+
+    def get_decoder(self, patterns: List[SignalPattern]) -> SignalDecoder:
+        key = self.canonical_key(patterns)
+
+        if key in self.decoders:
+            self.hits += 1
+            self.decoders.move_to_end(key)
+            return self.decoders[key]
+
+        self.misses += 1
+        decoder = SignalDecoder(patterns)
+        self.decoders[key] = decoder
+
+        if len(self.decoders) > self.max_size:
+            self.decoders.popitem(last=False)
+            self.evictions += 1
+
+        return decoder
+
+    def __len__(self) -> int:
+        return len(self.decoders)
+
+
 def intersection_size(s1: Set[str], s2: Set[str]) -> int:
     return len(s1 & s2)
 
 
-def step_1(input_displays: List[ProblemInputRow]) -> int:
+def step_1(input_displays: List[ProblemInputRow], decoder_cache: Optional[DecoderCache] = None) -> int:
+    if decoder_cache is None:
+        decoder_cache = DecoderCache()
     unique_digits_count = 0
     unique_digits = set("1478")
 
@@ -162,22 +211,220 @@ def step_1(input_displays: List[ProblemInputRow]) -> int:
         return sum(digit_count[digit] for digit in unique_digits)
 
     for display_pattern, printed_segments in input_displays:
-        decoded_display = SignalDecoder(display_pattern).translate_printed_segments(printed_segments)
+        decoded_display = decoder_cache.get_decoder(display_pattern).translate_printed_segments(printed_segments)
         unique_digits_count += count_occurences(decoded_display)
 
     return unique_digits_count
 
 
-def step_2(input_displays: List[ProblemInputRow]) -> int:
+def step_2(input_displays: List[ProblemInputRow], decoder_cache: Optional[DecoderCache] = None) -> int:
+    if decoder_cache is None:
+        decoder_cache = DecoderCache()
+
     def parse_input_to_int(input_display: ProblemInputRow) -> int:
         display_pattern, printed_segments = input_display
-        decoded_display = SignalDecoder(display_pattern).translate_printed_segments(printed_segments)
+        decoded_display = decoder_cache.get_decoder(display_pattern).translate_printed_segments(printed_segments)
 
         return int(decoded_display)
 
     return sum(parse_input_to_int(row) for row in input_displays)
 
 
+SEGMENTS = 'abcdefg'
+PATTERNS_PER_DISPLAY = 10
+DIGITS_PER_DISPLAY = 4
+
+DIGIT_SEGMENTS = {
+    0: 'abcefg',
+    1: 'cf',
+    2: 'acdeg',
+    3: 'acdfg',
+    4: 'bcdf',
+    5: 'abdfg',
+    6: 'abdefg',
+    7: 'acf',
+    8: 'abcdefg',
+    9: 'abcdfg',
+}
+
+
+def pattern_to_mask(pattern: Union[SignalPattern, str]) -> int:
+    return sum(1 << SEGMENTS.index(segment) for segment in set(pattern))
+
+
+def build_signature_table() -> np.ndarray:
+    """
+    Every segment lights up in a number of digits that does not depend on the wiring
+    (e.g. 'e' in 4 digits, 'f' in 9), so the sum of these counts over the segments of a
+    digit is a wiring-invariant signature, and it happens to be unique for every digit.
+    """
+    occurrences = Counter(''.join(DIGIT_SEGMENTS.values()))
+    signatures = {
+        digit: sum(occurrences[segment] for segment in segments) for digit, segments in DIGIT_SEGMENTS.items()
+    }
+    assert len(set(signatures.values())) == len(signatures)
+
+    # a malformed display can light a segment in all its patterns, up to 7 * 10
+    table = np.full(len(SEGMENTS) * len(DIGIT_SEGMENTS) + 1, -1, dtype=np.int8)
+    for digit, signature in signatures.items():
+        table[signature] = digit
+
+    return table
+
+
+SIGNATURE_TO_DIGIT = build_signature_table()
+
+
+class SignalMaskDecoder:
+    def __init__(self, patterns: List[int]):
+        segment_occurrences = [
+            sum((pattern >> segment) & 1 for pattern in patterns) for segment in range(len(SEGMENTS))
+        ]
+
+        self.mask_to_digit = np.full(1 << len(SEGMENTS), -1, dtype=np.int8)
+        for pattern in patterns:
+            signature = sum(
+                occurrences for segment, occurrences in enumerate(segment_occurrences) if (pattern >> segment) & 1
+            )
+            self.mask_to_digit[pattern] = SIGNATURE_TO_DIGIT[signature]
+
+        if sorted(self.mask_to_digit[patterns].tolist()) != list(range(len(DIGIT_SEGMENTS))):
+            raise RuntimeError(f'Cannot decode the patterns {patterns}')
+
+    def translate_printed_masks(self, masks: List[int]) -> str:
+        digits = self.mask_to_digit[masks]
+        if (digits < 0).any():
+            raise RuntimeError(f'Cannot translate the patterns {masks}')
+
+        return ''.join(map(str, digits))
+
+
+def parse_display_masks(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parse display rows straight from the raw bytes into 7-bit masks.
+
+    :return: the (n, 10) matrix of the patterns and the (n, 4) matrix of the printed digits
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    is_segment = (raw >= ord('a')) & (raw <= ord('g'))
+
+    segment_bits = np.left_shift(1, raw[is_segment] - ord('a')).astype(np.uint8)
+    token_start = is_segment & ~np.concatenate(([False], is_segment[:-1]))
+    token_starts = np.flatnonzero(token_start[is_segment])
+
+    if token_starts.shape[0] == 0:
+        masks = np.empty(0, dtype=np.uint8)
+    else:
+        masks = np.bitwise_or.reduceat(segment_bits, token_starts)
+
+    rows = masks.reshape(-1, PATTERNS_PER_DISPLAY + DIGITS_PER_DISPLAY)
+
+    return rows[:, :PATTERNS_PER_DISPLAY], rows[:, PATTERNS_PER_DISPLAY:]
+
+
+def read_display_masks(file_path: str) -> Tuple[np.ndarray, np.ndarray]:
+    with open(file_path, 'rb') as f:
+        return parse_display_masks(f.read())
+
+
+def decode_displays(patterns: np.ndarray, printed: np.ndarray) -> np.ndarray:
+    """
+    Decode every display at once.
+
+    :return: the (n, 4) matrix of the printed digits
+    """
+    rows = np.arange(patterns.shape[0])[:, np.newaxis]
+
+    segment_bits = (patterns[:, :, np.newaxis] >> np.arange(len(SEGMENTS), dtype=np.uint8)) & 1
+    segment_occurrences = segment_bits.sum(axis=1, dtype=np.int64)
+    signatures = np.einsum('nps,ns->np', segment_bits, segment_occurrences)
+
+    pattern_digits = SIGNATURE_TO_DIGIT[signatures]
+    undecodable = (np.sort(pattern_digits, axis=1) != np.arange(len(DIGIT_SEGMENTS))).any(axis=1)
+    if undecodable.any():
+        raise RuntimeError(f'Cannot decode the patterns {patterns[undecodable].tolist()}')
+
+    mask_to_digit = np.full((patterns.shape[0], 1 << len(SEGMENTS)), -1, dtype=np.int8)
+    mask_to_digit[rows, patterns] = pattern_digits
+
+    digits = mask_to_digit[rows, printed]
+    if (digits < 0).any():
+        raise RuntimeError(f'Cannot translate the patterns {printed[(digits < 0).any(axis=1)].tolist()}')
+
+    return digits
+
+
+def count_unique_digits(digits: np.ndarray) -> int:
+    return int(np.isin(digits, (1, 4, 7, 8)).sum())
+
+
+def sum_displays(digits: np.ndarray) -> int:
+    return int((digits.astype(np.int64) @ (10 ** np.arange(DIGITS_PER_DISPLAY - 1, -1, -1))).sum())
+
+
+DISPLAY_CHUNK_SIZE = 1 << 24
+
+DisplaySums = Tuple[int, int]
+
+
+def line_aligned_chunks(file_path: str, chunk_size: int = DISPLAY_CHUNK_SIZE) -> Generator[Tuple[int, int], None, None]:
+    file_size = os.path.getsize(file_path)
+    start = 0
+
+    with open(file_path, 'rb') as f:
+        while start < file_size:
+            f.seek(min(start + chunk_size, file_size))
+            f.readline()
+            end = min(f.tell(), file_size)
+
+            yield start, end
+            start = end
+
+
+def decode_display_chunk(file_path: str, start: int, end: int) -> DisplaySums:
+    """
+    :return: the partial results of step 1 and step 2 for the rows in [start, end)
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        digits = decode_displays(*parse_display_masks(f.read(end - start)))
+
+    return count_unique_digits(digits), sum_displays(digits)
+
+
+def stream_display_sums(file_path: str, chunk_size: int = DISPLAY_CHUNK_SIZE,
+                        workers: Optional[int] = None) -> Generator[DisplaySums, None, None]:
+    """
+    Decode a display log chunk by chunk, yielding the partial results of step 1 and step 2
+    of every chunk as soon as they are available.
+
+    Only one chunk per worker is held in memory. With more than one worker the chunks are
+    decoded by a process pool and the partial results come in completion order.
+    """
+    if workers is None or workers <= 1:
+        for start, end in line_aligned_chunks(file_path, chunk_size):
+            yield decode_display_chunk(file_path, start, end)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(decode_display_chunk, file_path, start, end)
+            for start, end in line_aligned_chunks(file_path, chunk_size)
+        ]
+
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def decode_display_log(file_path: str, chunk_size: int = DISPLAY_CHUNK_SIZE, workers: Optional[int] = None) -> DisplaySums:
+    unique_digits_count, displays_sum = 0, 0
+    for chunk_unique_digits, chunk_sum in stream_display_sums(file_path, chunk_size, workers):
+        unique_digits_count += chunk_unique_digits
+        displays_sum += chunk_sum
+
+    return unique_digits_count, displays_sum
+
+
 if __name__ == '__main__':
     test_input = read_patterns_and_segments('input_test.txt')
     real_input = read_patterns_and_segments('input.txt')
@@ -187,6 +434,36 @@ if __name__ == '__main__':
 
     assert step_2(real_input) == 1091609
 
+    wirings = {DecoderCache.canonical_key(patterns) for patterns, _ in real_input}
+    shared_cache = DecoderCache(max_size=len(wirings))
+    assert step_2(real_input + real_input, shared_cache) == 2 * 1091609
+    assert shared_cache.misses == len(shared_cache) == len(wirings)
+    assert shared_cache.hits == 2 * len(real_input) - len(wirings)
+    assert shared_cache.evictions == 0
+
+    small_cache = DecoderCache(max_size=2)
+    first, second, third = [patterns for patterns, _ in real_input[:3]]
+    for patterns in (first, second, first, third):
+        small_cache.get_decoder(patterns)
+    assert list(small_cache.decoders) == [DecoderCache.canonical_key(first), DecoderCache.canonical_key(third)]
+    assert (small_cache.hits, small_cache.misses, small_cache.evictions) == (1, 3, 1)
+
+    test_digits = decode_displays(*read_display_masks('input_test.txt'))
+    real_digits = decode_displays(*read_display_masks('input.txt'))
+
+    assert count_unique_digits(test_digits) == 26
+    assert count_unique_digits(real_digits) == 456
+    assert sum_displays(real_digits) == 1091609
+
+    assert decode_display_log('input.txt') == (456, 1091609)
+    assert decode_display_log('input.txt', chunk_size=1024, workers=4) == (456, 1091609)
+
+    first_patterns, first_printed = real_input[0]
+    first_decoder = SignalMaskDecoder(list(map(pattern_to_mask, first_patterns)))
+    assert first_decoder.translate_printed_masks(list(map(pattern_to_mask, first_printed))) == ''.join(
+        map(str, real_digits[0])
+    )
+
 
 
 
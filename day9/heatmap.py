@@ -1,5 +1,9 @@
+import os
 import numpy as np
-from typing import Set
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import product
+from typing import Set, Tuple, List, Optional
 from collections import namedtuple
 
 
@@ -7,31 +11,33 @@ def read_input(file_path: str) -> np.ndarray:
     with open(file_path, 'r') as f:
         return np.array([
             list(map(int, row.strip())) for row in f.readlines()
-        ])
+        ], dtype=np.uint8)
 
 
-def find_low_points(heatmap: np.ndarray):
-    row_count, col_count = heatmap.shape
-    for row in range(row_count):
-        start_row = max(0, row - 1)
-        end_row = min(row_count - 1, row + 1) + 1
-        for col in range(col_count):
-            start_col = max(0, col - 1)
-            end_col = min(col_count - 1, col + 1) + 1
+def find_low_points(heatmap: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compare every location with its four neighbours at once, through shifted views of the
+    heatmap padded with the highest representable height.
 
-            value = heatmap[row, col]
-            if value == heatmap[start_row:end_row, start_col:end_col].min():
-                yield row, col
+    :return: the rows and the columns of the low points
+    """
+    highest = np.iinfo(heatmap.dtype).max if np.issubdtype(heatmap.dtype, np.integer) else np.inf
+    padded = np.pad(heatmap, 1, constant_values=highest)
+
+    low_points = (
+        (heatmap < padded[:-2, 1:-1])
+        & (heatmap < padded[2:, 1:-1])
+        & (heatmap < padded[1:-1, :-2])
+        & (heatmap < padded[1:-1, 2:])
+    )
+
+    return np.nonzero(low_points)
 
 
 def step_1(heatmap: np.ndarray) -> int:
-    low_points_pos = list(find_low_points(heatmap))
-    pos = (
-        np.array([x for x, _ in low_points_pos]),
-        np.array([y for _, y in low_points_pos])
-    )
+    low_points = heatmap[find_low_points(heatmap)]
 
-    return (heatmap[pos] + 1).sum()
+    return int(low_points.sum(dtype=np.int64)) + low_points.shape[0]
 
 
 HeatMapPosition = namedtuple('HeatMapPosition', ['x', 'y'])
@@ -72,12 +78,259 @@ def step_2(heatmap: np.ndarray) -> int:
 
         return size
 
-    low_points = map(lambda point: HeatMapPosition(*point), find_low_points(heatmap))
+    low_points = map(lambda point: HeatMapPosition(*point), zip(*find_low_points(heatmap)))
     basins_size = sorted(map(basin_size, low_points), reverse=True)
 
     return basins_size[0] * basins_size[1] * basins_size[2]
 
 
+BASIN_BORDER = 9
+
+
+def find_row_runs(is_basin: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :return: row, first column and last column (excluded) of every maximal horizontal run
+        of basin locations, in row-major order
+    """
+    rows, cols = is_basin.shape
+    bounded = np.zeros((rows, cols + 2), dtype=np.int8)
+    bounded[:, 1:-1] = is_basin
+
+    run_row, run_start = np.nonzero(np.diff(bounded, axis=1) == 1)
+    _, run_end = np.nonzero(np.diff(bounded, axis=1) == -1)
+
+    return run_row, run_start, run_end
+
+
+def connect_runs(run_row: np.ndarray, run_start: np.ndarray, run_end: np.ndarray, cols: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pairs of runs on consecutive rows sharing at least one column.
+    """
+    width = cols + 1
+    start_keys = run_row * width + run_start
+    end_keys = run_row * width + run_end
+
+    # candidates on the next row end after the run starts and start before the run ends
+    first = np.searchsorted(end_keys, (run_row + 1) * width + run_start, side='right')
+    last = np.searchsorted(start_keys, (run_row + 1) * width + run_end, side='left')
+    neighbours_count = np.maximum(last - first, 0)
+
+    upper = np.repeat(np.arange(run_row.shape[0]), neighbours_count)
+    first_of_pair = np.repeat(np.cumsum(neighbours_count) - neighbours_count, neighbours_count)
+    lower = np.repeat(first, neighbours_count) + np.arange(upper.shape[0]) - first_of_pair
+
+    return upper, lower
+
+
+def union_find_roots(num_of_nodes: int, first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """
+    Array-backed union-find: every edge hooks the larger root under the smaller one, then
+    pointer jumping flattens the trees, until every edge joins nodes with the same root.
+    """
+    parent = np.arange(num_of_nodes)
+
+    while True:
+        first_root, second_root = parent[first], parent[second]
+        pending = first_root != second_root
+        if not pending.any():
+            return parent
+
+        np.minimum.at(
+            parent,
+            np.maximum(first_root, second_root)[pending],
+            np.minimum(first_root, second_root)[pending]
+        )
+
+        while True:
+            grandparent = parent[parent]
+            if (grandparent == parent).all():
+                break
+            parent = grandparent
+
+
+def label_basins(heatmap: np.ndarray) -> Tuple[np.ndarray, int]:
+    """
+    Label every basin, i.e. every 4-connected region of locations lower than 9, through a
+    scanline labeling of the horizontal runs of the basins.
+
+    :return: the labels of the locations, 0 for the basin borders, and the number of basins
+    """
+    rows, cols = heatmap.shape
+    is_basin = heatmap != BASIN_BORDER
+
+    run_row, run_start, run_end = find_row_runs(is_basin)
+    roots = union_find_roots(run_row.shape[0], *connect_runs(run_row, run_start, run_end, cols))
+    _, run_labels = np.unique(roots, return_inverse=True)
+
+    labels = np.zeros(rows * cols, dtype=np.int32)
+    labels[is_basin.ravel()] = np.repeat(run_labels.astype(np.int32) + 1, run_end - run_start)
+
+    return labels.reshape(rows, cols), int(run_labels.max()) + 1 if run_labels.shape[0] > 0 else 0
+
+
+def largest_basins_product(heatmap: np.ndarray, count: int = 3) -> int:
+    labels, _ = label_basins(heatmap)
+    basins_size = np.bincount(labels.ravel())[1:]
+
+    return int(np.prod(np.partition(basins_size, -count)[-count:], dtype=np.int64))
+
+
+TILE_SIZE = 2048
+
+
+@dataclass(frozen=True)
+class HeatmapFile:
+    """
+    Heatmap stored on disk, either as the puzzle digits or as raw uint8 heights, read
+    through a memory map one block at a time.
+    """
+    file_path: str
+    rows: int
+    cols: int
+    row_length: int
+    zero: int
+
+    @staticmethod
+    def from_digits(file_path: str) -> "HeatmapFile":
+        with open(file_path, 'rb') as f:
+            first_row = f.readline()
+
+        row_length = len(first_row)
+        cols = len(first_row.rstrip(b'\r\n'))
+        rows = -(-os.path.getsize(file_path) // row_length)
+
+        return HeatmapFile(file_path, rows, cols, row_length, ord('0'))
+
+    @staticmethod
+    def from_binary(file_path: str, cols: int) -> "HeatmapFile":
+        return HeatmapFile(file_path, os.path.getsize(file_path) // cols, cols, cols, 0)
+
+    def read_block(self, rows: slice, cols: slice) -> np.ndarray:
+        first_row, last_row, _ = rows.indices(self.rows)
+        raw = np.memmap(self.file_path, dtype=np.uint8, mode='r')[first_row * self.row_length:last_row * self.row_length]
+
+        # the last row of a digits file may lack its newline
+        missing = (last_row - first_row) * self.row_length - raw.shape[0]
+        if missing > 0:
+            raw = np.concatenate((raw, np.full(missing, ord('\n'), dtype=np.uint8)))
+
+        return raw.reshape(-1, self.row_length)[:, cols] - np.uint8(self.zero)
+
+    def convert_to_binary(self, file_path: str, rows_per_block: int = TILE_SIZE) -> "HeatmapFile":
+        with open(file_path, 'wb') as f:
+            for first_row in range(0, self.rows, rows_per_block):
+                f.write(self.read_block(slice(first_row, first_row + rows_per_block), slice(0, self.cols)).tobytes())
+
+        return HeatmapFile.from_binary(file_path, self.cols)
+
+
+@dataclass
+class TileResult:
+    risk_level: int
+    basins_size: np.ndarray
+    top_labels: np.ndarray
+    bottom_labels: np.ndarray
+    left_labels: np.ndarray
+    right_labels: np.ndarray
+
+
+def process_tile(heatmap_file: HeatmapFile, rows: slice, cols: slice) -> TileResult:
+    """
+    Find the low points and label the basins of a tile.
+
+    Low points are searched on the tile surrounded by a one location halo, so the ones on
+    the tile border are compared with their neighbours in the adjacent tiles.
+    """
+    halo_rows = slice(max(0, rows.start - 1), min(heatmap_file.rows, rows.stop + 1))
+    halo_cols = slice(max(0, cols.start - 1), min(heatmap_file.cols, cols.stop + 1))
+    with_halo = heatmap_file.read_block(halo_rows, halo_cols)
+
+    core = (slice(rows.start - halo_rows.start, rows.stop - halo_rows.start),
+            slice(cols.start - halo_cols.start, cols.stop - halo_cols.start))
+    tile = with_halo[core]
+
+    low_points = np.zeros(with_halo.shape, dtype=bool)
+    low_points[find_low_points(with_halo)] = True
+    low_heights = tile[low_points[core]]
+
+    labels, _ = label_basins(tile)
+
+    return TileResult(
+        int(low_heights.sum(dtype=np.int64)) + low_heights.shape[0],
+        np.bincount(labels.ravel())[1:],
+        labels[0, :].copy(), labels[-1, :].copy(), labels[:, 0].copy(), labels[:, -1].copy()
+    )
+
+
+def merge_tile_basins(tiles: List[List[TileResult]]) -> np.ndarray:
+    """
+    Join the basins crossing the tile seams with a union-find over the border labels only.
+
+    :return: the size of every basin of the whole heatmap
+    """
+    offsets = np.cumsum([0] + [tile.basins_size.shape[0] for row in tiles for tile in row])
+    offset_of = {
+        (tile_row, tile_col): offsets[tile_row * len(tiles[0]) + tile_col]
+        for tile_row, tile_col in product(range(len(tiles)), range(len(tiles[0])))
+    }
+
+    first, second = [], []
+
+    def join_seam(first_labels: np.ndarray, first_offset: int, second_labels: np.ndarray, second_offset: int):
+        both_basins = (first_labels > 0) & (second_labels > 0)
+        first.append(first_labels[both_basins] - 1 + first_offset)
+        second.append(second_labels[both_basins] - 1 + second_offset)
+
+    for (tile_row, tile_col), offset in offset_of.items():
+        tile = tiles[tile_row][tile_col]
+        if tile_col + 1 < len(tiles[0]):
+            join_seam(tile.right_labels, offset, tiles[tile_row][tile_col + 1].left_labels,
+                      offset_of[tile_row, tile_col + 1])
+        if tile_row + 1 < len(tiles):
+            join_seam(tile.bottom_labels, offset, tiles[tile_row + 1][tile_col].top_labels,
+                      offset_of[tile_row + 1, tile_col])
+
+    roots = union_find_roots(
+        int(offsets[-1]),
+        np.concatenate(first or [np.empty(0, dtype=np.int64)]).astype(np.int64),
+        np.concatenate(second or [np.empty(0, dtype=np.int64)]).astype(np.int64)
+    )
+    basins_size = np.concatenate([tile.basins_size for row in tiles for tile in row])
+
+    merged_size = np.bincount(roots, weights=basins_size, minlength=int(offsets[-1])).astype(np.int64)
+
+    return merged_size[merged_size > 0]
+
+
+def process_heatmap_tiles(heatmap_file: HeatmapFile, tile_size: int = TILE_SIZE,
+                          workers: Optional[int] = None) -> Tuple[int, np.ndarray]:
+    """
+    Process a heatmap too large for memory one tile at a time, in parallel when `workers`
+    is greater than one. Only the risk level, the basin sizes and the border labels of a
+    tile come back from the workers.
+
+    :return: the risk level of the low points and the size of every basin
+    """
+    tile_rows = [slice(start, min(start + tile_size, heatmap_file.rows)) for start in range(0, heatmap_file.rows, tile_size)]
+    tile_cols = [slice(start, min(start + tile_size, heatmap_file.cols)) for start in range(0, heatmap_file.cols, tile_size)]
+    tile_slices = list(product(tile_rows, tile_cols))
+
+    if workers is None or workers <= 1:
+        results = [process_tile(heatmap_file, rows, cols) for rows, cols in tile_slices]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                process_tile,
+                [heatmap_file] * len(tile_slices),
+                [rows for rows, _ in tile_slices],
+                [cols for _, cols in tile_slices]
+            ))
+
+    tiles = [results[row * len(tile_cols):(row + 1) * len(tile_cols)] for row in range(len(tile_rows))]
+
+    return sum(tile.risk_level for tile in results), merge_tile_basins(tiles)
+
+
 if __name__ == '__main__':
     heatmap = read_input('input.txt')
     example = read_input('input_test.txt')
@@ -85,4 +338,18 @@ if __name__ == '__main__':
     assert step_1(example) == 15
     assert step_2(example) == 1134
     assert step_1(heatmap) == 502
-    assert step_2(heatmap) == 1330560
\ No newline at end of file
+    assert step_2(heatmap) == 1330560
+
+    assert largest_basins_product(example) == 1134
+    assert largest_basins_product(heatmap) == 1330560
+
+    heatmap_file = HeatmapFile.from_digits('input.txt')
+    assert (heatmap_file.read_block(slice(0, heatmap_file.rows), slice(0, heatmap_file.cols)) == heatmap).all()
+
+    risk_level, tiled_basins_size = process_heatmap_tiles(heatmap_file, tile_size=17, workers=4)
+    assert risk_level == 502
+    assert np.prod(np.partition(tiled_basins_size, -3)[-3:]) == 1330560
+
+    risk_level, tiled_basins_size = process_heatmap_tiles(HeatmapFile.from_digits('input_test.txt'), tile_size=3)
+    assert risk_level == 15
+    assert np.prod(np.partition(tiled_basins_size, -3)[-3:]) == 1134
\ No newline at end of file